@@ -1,30 +1,70 @@
 # code to clean the csv files
 # original files contain too many columns, we only want the Date, Open, High, Low, Close, and Volume columns
 # the range of date we need is from 2016-10-03 to 2020-07-31
+# the files are cleaned in parallel (a process pool), then convert_to_columnar.py (next to the api that
+# reads its output) writes the columnar copies of the cleaned csvs and the date aligned price panel
+# that calculation_api.py memory maps at startup
+#   python clean_data/stock_cleaning.py --workers 8
 
-import pandas as pd
+import argparse
 import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import pandas as pd
 
 # Define the directory containing the CSV files
 csv_dir = "original"
 target_dir = "clean_data/stock_data"
+START_DATE = "2016-10-03"
+END_DATE = "2020-07-31"
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+CONVERT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "components", "dashboard",
+                              "calculations", "convert_to_columnar.py")
 
-# Get all CSV files in the directory
-csv_files = [f for f in os.listdir(csv_dir) if f.endswith('.csv')]
 
-# Process each CSV file
-for file in csv_files:
-    # Read the CSV file
-    df = pd.read_csv(os.path.join(csv_dir, file))
-    
-    # Filter the date range
-    df = df[(df['Date'] >= '2016-10-03') & (df['Date'] <= '2020-07-31')]
-    
-    # Select the columns we want 
-    df = df[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']]
+def clean_file(file, csv_dir=csv_dir, target_dir=target_dir, start_date=START_DATE, end_date=END_DATE):
+    # Read only the columns we want
+    df = pd.read_csv(os.path.join(csv_dir, file), usecols=["Date"] + PRICE_FIELDS)[["Date"] + PRICE_FIELDS]
+
+    # Filter the date range on the parsed dates (int64 ns since epoch, UTC), not on the strings:
+    # "2020-07-31 00:00:00-04:00" <= "2020-07-31" is False, so the string filter lost the last day
+    dates = pd.DatetimeIndex(pd.to_datetime(df["Date"], utc=True), name="Date").as_unit("ns")
+    timestamps = dates.asi8
+    start = pd.Timestamp(start_date, tz="UTC").value
+    end = (pd.Timestamp(end_date, tz="UTC") + pd.Timedelta(days=1)).value
+    in_range = (timestamps >= start) & (timestamps < end)
+    df = df[in_range]
 
     # Save the cleaned CSV file
     df.to_csv(os.path.join(target_dir, file), index=False)
+    return os.path.splitext(file)[0], len(df)
+
+
+def clean_all(csv_dir=csv_dir, target_dir=target_dir, workers=None):
+    # Get all CSV files in the directory
+    csv_files = sorted(f for f in os.listdir(csv_dir) if f.endswith('.csv'))
+    os.makedirs(target_dir, exist_ok=True)
+
+    # Process the CSV files, thousands of small files so they are handed out in batches
+    clean = partial(clean_file, csv_dir=csv_dir, target_dir=target_dir)
+    with ProcessPoolExecutor(workers) as pool:
+        days = dict(pool.map(clean, csv_files, chunksize=max(1, len(csv_files) // (8 * (workers or os.cpu_count() or 1)))))
+
+    # columnar copies + price panel, the script imports the api's modules from its own directory
+    subprocess.run([sys.executable, CONVERT_SCRIPT, "--stock-dir", target_dir, "--skip-tweets"], check=True)
+    return days
+
 
-print("CSV files have been cleaned and saved to the target directory.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="clean the original stock csvs")
+    parser.add_argument("--csv-dir", default=csv_dir)
+    parser.add_argument("--target-dir", default=target_dir)
+    parser.add_argument("--workers", type=int, default=None, help="default: every core")
+    args = parser.parse_args()
 
+    start = time.time()
+    days = clean_all(args.csv_dir, args.target_dir, args.workers)
+    print(f"{len(days)} CSV files have been cleaned and saved to the target directory in {time.time() - start:.1f}s.")
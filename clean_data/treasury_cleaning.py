@@ -0,0 +1,58 @@
+# downloads the daily US treasury yields from FRED and saves one csv per tenor for the risk free rate
+# (src/components/dashboard/calculations/risk_free.py and src/components/metrics.py)
+# FRED series: 3 month T-bill DGS3MO, 5 year DGS5, 10 year DGS10, 30 year DGS30
+# without internet, download the csvs by hand (https://fred.stlouisfed.org/series/DGS10 -> Download -> CSV),
+# put them in original/ as DGS3MO.csv, DGS5.csv, ... and run with --source-dir original
+#   python clean_data/treasury_cleaning.py
+'''
+FRED csv structure (older downloads have DATE as the header and "." for missing days):
+observation_date,DGS10
+2016-10-03,1.63
+2016-10-04,1.69
+'''
+# We want to have columns: Date, Close (the yield in percent, like the ^TNX quotes on yahoo finance)
+# the range of date we need is the one of the stock data, from 2016-10-03 to 2020-07-31
+
+import argparse
+import os
+import pandas as pd
+
+target_dir = "clean_data/treasury_data"
+FRED_URL = "https://fred.stlouisfed.org/graph/fredgraph.csv?id={series}"
+TENORS = {"3M": "DGS3MO", "5Y": "DGS5", "10Y": "DGS10", "30Y": "DGS30"}
+START_DATE = "2016-10-03"
+END_DATE = "2020-07-31"
+
+
+def read_fred(series, source_dir=None):
+    source = os.path.join(source_dir, f"{series}.csv") if source_dir else FRED_URL.format(series=series)
+    df = pd.read_csv(source, na_values=["."])
+    # first column is the date, second the yield, whatever the headers are called
+    df = df.iloc[:, :2]
+    df.columns = ["Date", "Close"]
+    df["Date"] = pd.to_datetime(df["Date"])
+    df["Close"] = pd.to_numeric(df["Close"], errors="coerce")
+    # bond market holidays have no yield
+    return df.dropna()
+
+
+def clean_yields(target_dir=target_dir, source_dir=None, start_date=START_DATE, end_date=END_DATE):
+    os.makedirs(target_dir, exist_ok=True)
+    for tenor, series in TENORS.items():
+        df = read_fred(series, source_dir)
+        df = df[(df["Date"] >= pd.Timestamp(start_date)) & (df["Date"] <= pd.Timestamp(end_date))]
+        df["Date"] = df["Date"].dt.strftime("%Y-%m-%d")
+        df.to_csv(os.path.join(target_dir, f"{tenor}.csv"), index=False)
+        print(f"{tenor} ({series}): {len(df)} days")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="save the daily treasury yields per tenor")
+    parser.add_argument("--target-dir", default=target_dir)
+    parser.add_argument("--source-dir", default=None, help="dir with FRED csvs downloaded by hand (default: download)")
+    parser.add_argument("--start-date", default=START_DATE)
+    parser.add_argument("--end-date", default=END_DATE)
+    args = parser.parse_args()
+
+    clean_yields(args.target_dir, args.source_dir, args.start_date, args.end_date)
+    print("Treasury yields have been saved to the target directory.")
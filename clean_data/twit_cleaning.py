@@ -14,7 +14,8 @@ Created_at,Tweet,Stock_Ticker,Company_Name,Sector,Score,Source,Consolidated_Comp
 # We want to have columns: Created_at(renamed to Date), Tweet, Stock_Ticker(renamed to Ticker), Score
 # save the cleaned data to a csv file, individual files for each stock
 
-# drop the time from the Created_at column
+# the source is read in chunks and every chunk is appended to the files of its tickers right away,
+# one pass over the file and memory bounded by the chunk size, no matter how big the dataset is
 import pandas as pd
 import os
 import re
@@ -22,31 +23,17 @@ import re
 # Define the directory containing the CSV files
 csv_dir = "original/complete_labelled_dataset.csv"
 target_dir = "clean_data/twit_data"
+CHUNK_SIZE = 100000
 
-# Read the CSV file
-df = pd.read_csv(csv_dir)
-
-# drop the time from the Created_at column
-df['Date'] = pd.to_datetime(df['Created_at']).dt.date
-
-# select the columns we want
-df = df[['Date', 'Tweet', 'Stock_Ticker', 'Score']]
-
-# rename the columns
-df = df.rename(columns={'Stock_Ticker': 'Ticker'})  
-
-# save the cleaned data to a csv file, individual files for each stock
 # rename the ticker for the following stocks:
 # FB -> META
 # GOOG -> GOOGL
-
 # consolidated company name and ticker is the column in the original file
 # that has the full name of the company and the ticker
-df.loc[df['Ticker'] == 'FB', 'Ticker'] = 'META'
-df.loc[df['Ticker'] == 'GOOG', 'Ticker'] = 'GOOGL'
+TICKER_RENAMES = {'FB': 'META', 'GOOG': 'GOOGL'}
 
 # remove VZ from the dataframe
-df = df[df['Ticker'] != 'VZ']
+DROPPED_TICKERS = {'VZ'}
 
 # use regex to remove unneeded text from the tweet column and save as a new column with space as the separator
 COMMON_WORDS = {
@@ -88,16 +75,51 @@ STOCK_TICKERS = {"CSCO", "BA", "V", "T", "BAC", "F", "PEP", "COST", "MRK", "ORCL
 STOCK_TICKERS_LOWER = {ticker.lower() for ticker in STOCK_TICKERS}
 STOCK_TICKERS_SHORT = {"cisco", "boeing", "visa", "att", "bofa", "ford", "pepsi", "costco", "merck", "oracle", "starbucks", "pg", "mcdonalds", "amazon", "intel", "coke", "paypal", "ups", "microsoft", "amd", "homedepot", "exxon", "chevron", "comcast", "nike", "kroger", "ibm", "disney", "netflix", "jpmorgan", "tesla", "sp500", "google", "meta", "pfizer", "united", "mastercard", "apple", "walmart", "johnson"}
 
-def clean_tweet(tweet):
-    words = re.findall(r'\b[a-zA-Z]{4,}\b', tweet.lower())
-    return " ".join([word for word in words if word not in COMMON_WORDS and word not in STOCK_TICKERS_LOWER and word not in STOCK_TICKERS_SHORT])
-
-df['Tweet'] = df['Tweet'].apply(clean_tweet)
-
-# save the cleaned data to a csv file, individual files for each stock
-for stock in df['Ticker'].unique():
-    df_stock = df[df['Ticker'] == stock]
-    df_stock.to_csv(os.path.join(target_dir, f"{stock}.csv"), index=False)
-    print(f"Saved {stock}.csv")
-
-print("CSV files have been cleaned and saved to the target directory.")
\ No newline at end of file
+EXCLUDED_WORDS = frozenset(COMMON_WORDS | STOCK_TICKERS_LOWER | STOCK_TICKERS_SHORT)
+WORD_RE = re.compile(r'\b[a-zA-Z]{4,}\b')
+
+def clean_tweets(tweets):
+    # words of 4+ letters that are not common words or stock names, for a whole column at once
+    words = tweets.fillna("").str.lower().str.findall(WORD_RE)
+    return [" ".join([word for word in tweet_words if word not in EXCLUDED_WORDS]) for tweet_words in words]
+
+def clean_chunk(df):
+    df = df.rename(columns={'Stock_Ticker': 'Ticker'})
+    df['Ticker'] = df['Ticker'].replace(TICKER_RENAMES)
+    df = df[~df['Ticker'].isin(DROPPED_TICKERS)]
+    # drop the time from the Created_at column
+    return pd.DataFrame({
+        'Date': pd.to_datetime(df['Created_at']).dt.date,
+        'Tweet': clean_tweets(df['Tweet']),
+        'Ticker': df['Ticker'],
+        'Score': df['Score'],
+    }, index=df.index)
+
+def split_by_ticker(csv_dir, target_dir, chunk_size=CHUNK_SIZE):
+    # one open writer per ticker, every file is written under a tmp name and renamed at the end,
+    # so an interrupted run never leaves half written files next to complete ones
+    os.makedirs(target_dir, exist_ok=True)
+    writers = {}
+    rows = {}
+    try:
+        for chunk in pd.read_csv(csv_dir, usecols=['Created_at', 'Tweet', 'Stock_Ticker', 'Score'], chunksize=chunk_size):
+            cleaned = clean_chunk(chunk)
+            for stock, df_stock in cleaned.groupby('Ticker', sort=False):
+                if stock not in writers:
+                    writers[stock] = open(os.path.join(target_dir, f"{stock}.csv.tmp"), "w", encoding="utf-8", newline="")
+                    rows[stock] = 0
+                df_stock.to_csv(writers[stock], header=rows[stock] == 0, index=False)
+                rows[stock] += len(df_stock)
+            print(f"cleaned {sum(rows.values())} tweets")
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for stock in writers:
+        os.replace(os.path.join(target_dir, f"{stock}.csv.tmp"), os.path.join(target_dir, f"{stock}.csv"))
+        print(f"Saved {stock}.csv ({rows[stock]} tweets)")
+    return rows
+
+if __name__ == "__main__":
+    split_by_ticker(csv_dir, target_dir)
+    print("CSV files have been cleaned and saved to the target directory.")
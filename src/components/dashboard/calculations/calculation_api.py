@@ -6,22 +6,82 @@
 # Dir of the data by for local use, *need to change when deploying*
 TWEET_DATA_DIR = "clean_data/twit_data/non_neutral" # non neutral is neutral tweets are filtered out
 STOCK_DATA_PATH = "clean_data/stock_data"
+TREASURY_DATA_PATH = "clean_data/treasury_data" # written by clean_data/treasury_cleaning.py
 
 # List of all the stock tickers to be used for the calculations and visualization
 STOCK_TICKERS = ["CSCO", "BA", "V", "T", "BAC", "F", "PEP", "COST", "MRK", "ORCL", "SBUX", "PG", "MCD", "AMZN", "INTC", "KO", "PYPL", "UPS", "MSFT", "AMD", "HD", "XOM", "CVX", "CMCSA", "NKE", "KR", "IBM", "DIS", "NFLX", "JPM", "TSLA", "SPY", "GOOGL", "META", "PFE", "UNH", "MA", "AAPL", "WMT", "JNJ"]
 
+# risk free rate from the daily treasury yields of this tenor (3M, 5Y, 10Y or 30Y), see risk_free.py
+# the constant annual rate is used when there is no treasury data (and before its first day)
+RISK_FREE_TENOR = "3M"
 RISK_FREE_RATE = 0.02
 
-import os
+# rolling beta / volatility / sharpe / correlation to SPY series, see /api/rolling_metrics
+# window lengths in trading days (daily returns), a request can only ask for these
+ROLLING_WINDOWS = [20, 60, 252]
+
+# responses are cached in memory, least recently used ones are dropped past this size
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESPONSE_CACHE_TTL_SECONDS = None # data is static, so no expiry by default
+
+# word bubbles are computed in a pool of worker processes, each holding its own copy of the tweets
+# and its count indexes, so memory grows with the number of workers
+WORD_BUBBLE_WORKERS = 2
+MAX_WORD_BUBBLE_BATCH = 50
+
+# online sentiment scoring, see sentiment_service.py (needs torch + transformers and the trained checkpoint)
+SENTIMENT_CHECKPOINT_PATH = "bertweet_regressor/checkpoint-7953"
+SENTIMENT_BACKEND = "fp32" # or "int8" / "onnx" on cpu only boxes, see src/data_processing/cpu_inference.py
+SENTIMENT_SCORE_CACHE = "score_cache.sqlite" # None to always run the model
+SENTIMENT_MAX_BATCH_SIZE = 32
+SENTIMENT_MAX_WAIT_MS = 10
+MAX_SENTIMENT_TEXTS = 256
+
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 import pandas as pd
 import numpy as np
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Optional, Tuple
 from fastapi.middleware.cors import CORSMiddleware
-from get_common_words import CommonWords
+from price_store import PriceStore
+from metrics_engine import (TRADING_DAYS, correlation_matrix, daily_returns, pairwise_correlation,
+                            rank_descending, ratios_from_moments)
+from moment_index import MomentIndex
+from risk_free import RiskFreeCurve
+from response_cache import ResponseCache, make_key
+from word_bubble_worker import make_pool, word_bubbles
+from sentiment_service import MicroBatcher, SentimentModel
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the word bubble workers are started by the first request (get_word_bubble_pool), stopped here
+    global word_bubble_pool
+    yield
+    if word_bubble_pool is not None:
+        word_bubble_pool.shutdown(cancel_futures=True)
+        word_bubble_pool = None
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+# all stock csvs are loaded once here, requests only slice the in-memory panel
+price_store = PriceStore(STOCK_DATA_PATH)
+moment_index = MomentIndex(price_store)
+risk_free_curve = RiskFreeCurve(TREASURY_DATA_PATH, price_store.dates, RISK_FREE_RATE)
+# (ticker, window) -> rolling metric series over the whole panel, filled by the first request that needs them
+rolling_series_cache: Dict[Tuple[str, int], Dict[str, np.ndarray]] = {}
+# the tweets used by the word bubbles are loaded by the pool's workers, see word_bubble_worker.py
+# the pool is only started by the first word bubble request, see get_word_bubble_pool
+word_bubble_pool: Optional[ProcessPoolExecutor] = None
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS)
+# the sentiment model is only loaded by the first /api/sentiment request
+sentiment_batcher = MicroBatcher(
+    SentimentModel(SENTIMENT_CHECKPOINT_PATH, SENTIMENT_BACKEND, SENTIMENT_SCORE_CACHE, SENTIMENT_MAX_BATCH_SIZE),
+    SENTIMENT_MAX_BATCH_SIZE, SENTIMENT_MAX_WAIT_MS)
 
 # Add CORS middleware
 app.add_middleware(
@@ -37,6 +97,10 @@ class StockRequest(BaseModel):
     start_date: str
     end_date: str
     
+class DateRangeRequest(BaseModel):
+    start_date: str
+    end_date: str
+
 class WordBubbleRequest(BaseModel):
     ticker: str
     start_date: str
@@ -44,151 +108,103 @@ class WordBubbleRequest(BaseModel):
     min_count_percentage: Optional[float] = 0.015
     top_n_words: Optional[int] = 7
     filter_metric: Optional[str] = "average_score"
+
+class WordBubbleBatchRequest(BaseModel):
+    requests: List[WordBubbleRequest]
+
+class RollingMetricsRequest(BaseModel):
+    tickers: List[str]
+    start_date: str
+    end_date: str
+    windows: Optional[List[int]] = None # default: all of ROLLING_WINDOWS
+
+class SentimentRequest(BaseModel):
+    texts: List[str]
     
 
+def encode_json(content) -> bytes:
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def cached_response(key, compute) -> Response:
+    # send back the stored json for a repeated request, otherwise compute, encode and store it
+    body = response_cache.get(key)
+    if body is None:
+        body = encode_json(compute())
+        response_cache.put(key, body)
+    return Response(content=body, media_type="application/json")
+
 def load_stock_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
-    file_path = os.path.join(STOCK_DATA_PATH, f"{ticker}.csv")
-    try:
-        df = pd.read_csv(file_path)
-        df['Date'] = pd.to_datetime(df['Date'], utc=True)
-        # Convert string dates to datetime
-        start_date_dt = pd.to_datetime(start_date, utc=True)
-        end_date_dt = pd.to_datetime(end_date, utc=True)
-        # Filter by date range
-        df = df[(df['Date'] >= start_date_dt) & (df['Date'] <= end_date_dt)]
-        return df
-    except FileNotFoundError:
+    if ticker not in price_store:
         raise HTTPException(status_code=404, detail=f"Stock data for {ticker} not found")
+    return price_store.frame(ticker, start_date, end_date)
 
-def calculate_returns(stock_data: pd.DataFrame) -> float:
-    # Calculate total return over the period for performance metrics calculations
-    first_price = stock_data['Close'].iloc[0]
-    last_price = stock_data['Close'].iloc[-1]
-    total_return = (last_price / first_price) - 1
-    return total_return
-
-def calculate_performance_metrics(stock_return: float, market_return: float, stock_data: pd.DataFrame, market_data: pd.DataFrame) -> dict:
-    # Calculate period length in trading days
-    period_days = len(stock_data)
-    if period_days < 1:
-        period_days = 1  # Default to 1 if no data available
-    
-    # Calculate the period's risk-free rate
-    period_risk_free_rate = RISK_FREE_RATE * (period_days / 252) # assume 252 trading days in a year
-    
-    # Calculate excess returns for the period
-    excess_stock_return = stock_return - period_risk_free_rate
-    excess_market_return = market_return - period_risk_free_rate
+def calculate_correlation_panel(request_ticker: str, tickers: List[str], returns: np.ndarray) -> dict:
+    # correlation of the requested stock's daily returns to every peer, all at once
+    # from the aligned (days x tickers) return panel
+    stock_returns = returns[:, [tickers.index(request_ticker)]]
+    corr = pairwise_correlation(stock_returns, returns)[0]
 
-    # Calculate daily returns for beta calculation
-    daily_stock_returns = stock_data['Close'].pct_change().dropna().values
-    daily_market_returns = market_data['Close'].pct_change().dropna().values
-    
-    min_length = min(len(daily_stock_returns), len(daily_market_returns))
-    if min_length > 1:
-        beta = np.cov(daily_stock_returns[:min_length], daily_market_returns[:min_length])[0, 1] / np.var(daily_market_returns[:min_length])
-    else:
-        beta = 1.0  # Default value
-    
-    alpha = stock_return - (period_risk_free_rate + beta * (market_return - period_risk_free_rate))
-    
-    if min_length > 1:
-        # Annualize the volatility
-        daily_volatility = np.std(daily_stock_returns)
-        annualized_volatility = daily_volatility * np.sqrt(252)
-        sharpe_ratio = excess_stock_return / annualized_volatility if annualized_volatility != 0 else 0
-    else:
-        sharpe_ratio = excess_stock_return / period_risk_free_rate if period_risk_free_rate != 0 else 0
-    
-    treynor_ratio = excess_stock_return / beta if beta != 0 else 0
-    
-    return {
-        "alpha": float(alpha),
-        "beta": float(beta),
-        "sharpe_ratio": float(sharpe_ratio),
-        "treynor_ratio": float(treynor_ratio)
-    }
+    correlations = {}
+    for ticker, value in zip(tickers, corr):
+        # Skip the requested stock itself and SPY (S&P 500)
+        if ticker == request_ticker or ticker == "SPY" or np.isnan(value):
+            continue
+        correlations[ticker] = value
+    return summarize_correlations(correlations)
 
-def calculate_correlation(request_ticker: str, stock_data: pd.DataFrame, all_stocks_data: Dict[str, pd.DataFrame]) -> dict:
-    if not stock_data.empty and len(all_stocks_data) > 0:
-        # Calculate daily returns for the requested stock
-        stock_returns = stock_data['Close'].pct_change().dropna()
-        
-        # Calculate correlations with all other stocks
-        correlations = {}
-        for ticker, data in all_stocks_data.items():
-            # Skip the requested stock itself and SPY (S&P 500)
-            if ticker == request_ticker or ticker == "SPY" or data.empty:
-                continue
-                
-            # Calculate daily returns for comparison stock
-            compare_returns = data['Close'].pct_change().dropna()
-            
-            # Align the two return series to ensure they have matching dates
-            aligned_returns = pd.concat([stock_returns, compare_returns], axis=1, join='inner')
-            aligned_returns.columns = ['stock', 'compare']
-            
-            # Skip if not enough data points for correlation
-            if len(aligned_returns) < 5:
-                continue
-                
-            # Calculate Pearson correlation
-            corr = aligned_returns['stock'].corr(aligned_returns['compare'])
-            if not np.isnan(corr):
-                correlations[ticker] = corr
-        
-        if not correlations:
-            return {
-                "most_correlated_stock": "None",
-                "most_correlated_stock_correlation": 0,
-                "least_correlated_stock": "None",
-                "least_correlated_stock_correlation": 0
-            }
-        
-        # Find most and least correlated stocks
-        most_correlated = max(correlations.items(), key=lambda x: x[1])
-        least_correlated = min(correlations.items(), key=lambda x: x[1])
-        
+def summarize_correlations(correlations: Dict[str, float]) -> dict:
+    if not correlations:
         return {
-            "most_correlated_stock": most_correlated[0],
-            "most_correlated_stock_correlation": float(most_correlated[1]),
-            "least_correlated_stock": least_correlated[0],
-            "least_correlated_stock_correlation": float(least_correlated[1])
+            "most_correlated_stock": "None",
+            "most_correlated_stock_correlation": 0,
+            "least_correlated_stock": "None",
+            "least_correlated_stock_correlation": 0
         }
-    
+
+    # Find most and least correlated stocks
+    most_correlated = max(correlations.items(), key=lambda x: x[1])
+    least_correlated = min(correlations.items(), key=lambda x: x[1])
+
     return {
-        "most_correlated_stock": "None",
-        "most_correlated_stock_correlation": 0,
-        "least_correlated_stock": "None",
-        "least_correlated_stock_correlation": 0
+        "most_correlated_stock": most_correlated[0],
+        "most_correlated_stock_correlation": float(most_correlated[1]),
+        "least_correlated_stock": least_correlated[0],
+        "least_correlated_stock_correlation": float(least_correlated[1])
     }
 
-@app.post("/api/word-bubbles")
-async def word_bubbles_endpoint(req: WordBubbleRequest):
-    print('TRYING TO GET SENTIMENT DATA')
-    try:
-        analyzer = CommonWords(
-            ticker=req.ticker.upper(),
-            data_dir=TWEET_DATA_DIR,
-            start_date=req.start_date,
-            end_date=req.end_date,
-            min_count_percentage=req.min_count_percentage,
-            top_n_words=req.top_n_words,
-            filter_metric=req.filter_metric,
-        )
-
-        result = analyzer.calculate()
+def get_word_bubble_pool() -> ProcessPoolExecutor:
+    global word_bubble_pool
+    if word_bubble_pool is None:
+        word_bubble_pool = make_pool(TWEET_DATA_DIR, WORD_BUBBLE_WORKERS)
+    return word_bubble_pool
+
+async def word_bubbles_body(req: WordBubbleRequest) -> bytes:
+    # encoded word bubble json for one request, from the cache or from a worker process
+    ticker = req.ticker.upper()
+    key = make_key("word-bubbles", ticker, req.start_date, req.end_date,
+                   min_count_percentage=req.min_count_percentage, top_n_words=req.top_n_words,
+                   filter_metric=req.filter_metric)
+
+    body = response_cache.get(key)
+    if body is None:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            get_word_bubble_pool(), word_bubbles, ticker, req.start_date, req.end_date,
+            req.min_count_percentage, req.top_n_words, req.filter_metric)
 
         if result is None:
             raise HTTPException(status_code=404, detail="No data found for this query.")
 
-        top_words, bottom_words, adj_matrix = result
+        body = encode_json(result)
+        response_cache.put(key, body)
+    return body
 
-        return {
-            "top_words": top_words,
-            "bottom_words": bottom_words,
-            "adj_matrix": adj_matrix,
-        }
+@app.post("/api/word-bubbles")
+async def word_bubbles_endpoint(req: WordBubbleRequest):
+    print('TRYING TO GET SENTIMENT DATA')
+    try:
+        body = await word_bubbles_body(req)
+        return Response(content=body, media_type="application/json")
 
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -197,97 +213,237 @@ async def word_bubbles_endpoint(req: WordBubbleRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
+@app.post("/api/word-bubbles/batch")
+async def word_bubbles_batch_endpoint(batch: WordBubbleBatchRequest):
+    # word bubbles for several tickers / windows at once, the requests run in parallel in the worker pool
+    # the response is a list in the same order as the requests, a failed request gets {"detail": ...} in its place
+    if len(batch.requests) > MAX_WORD_BUBBLE_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_WORD_BUBBLE_BATCH} requests per batch")
+
+    results = await asyncio.gather(*(word_bubbles_body(req) for req in batch.requests), return_exceptions=True)
+
+    parts = []
+    for req, result in zip(batch.requests, results):
+        if isinstance(result, bytes):
+            parts.append(result)
+        elif isinstance(result, HTTPException):
+            parts.append(encode_json({"detail": result.detail}))
+        elif isinstance(result, FileNotFoundError):
+            parts.append(encode_json({"detail": str(result)}))
+        else:
+            print(f"word bubbles failed for {req.ticker}: {result!r}")
+            parts.append(encode_json({"detail": f"Internal error: {str(result)}"}))
+    return Response(content=b"[" + b",".join(parts) + b"]", media_type="application/json")
+
 
 @app.post("/api/stock_data")
 async def stock_data(request: StockRequest):
     try:
-        stock_df = load_stock_data(request.stock_ticker, request.start_date, request.end_date)
-        stock_data_list = stock_df.to_dict(orient='records')
-        return stock_data_list
+        key = make_key("stock_data", request.stock_ticker, request.start_date, request.end_date)
+
+        def compute():
+            stock_df = load_stock_data(request.stock_ticker, request.start_date, request.end_date)
+            stock_data_list = stock_df.to_dict(orient='records')
+            return stock_data_list
+
+        return cached_response(key, compute)
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error processing stock data: {str(e)}")
 
+@app.post("/api/correlation_matrix")
+async def correlation_matrix_endpoint(request: DateRangeRequest):
+    # full correlation matrix of daily returns between all stocks (SPY included) for the correlation chart
+    try:
+        key = make_key("correlation_matrix", None, request.start_date, request.end_date)
+
+        def compute():
+            _, closes = price_store.closes(request.start_date, request.end_date)
+            matrix = correlation_matrix(daily_returns(closes))
+            return {
+                "tickers": price_store.tickers,
+                "matrix": [[None if np.isnan(value) else float(value) for value in row] for row in matrix],
+            }
+
+        return cached_response(key, compute)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+def calculate_metrics(request: StockRequest) -> dict:
+    if request.stock_ticker not in price_store:
+        raise HTTPException(status_code=404, detail=f"Stock data for {request.stock_ticker} not found")
+
+    # tickers to rank against, requested stock goes last like in the ranking dicts before
+    universe = [ticker for ticker in STOCK_TICKERS if ticker != request.stock_ticker and ticker in price_store]
+    universe.append(request.stock_ticker)
+
+    cols = [price_store.ticker_index[ticker] for ticker in universe]
+
+    # window sums for every stock come from the prefix sum index, no pass over the window's rows
+    lo, hi = price_store.window(request.start_date, request.end_date)
+    stats = moment_index.window_stats(lo, hi)
+    stock_returns = stats["stock_return"][cols]
+    period_days = stats["period_days"][cols]
+
+    # skip stocks with missing data
+    has_data = period_days > 0
+    stock_idx = len(universe) - 1
+    market_idx = universe.index("SPY")
+    if not has_data[stock_idx] or not has_data[market_idx]:
+        raise HTTPException(status_code=404, detail=f"No stock data for {request.stock_ticker} in this date range")
+
+    # risk free return of every stock's window from the running compounding factors
+    period_risk_free_rate = risk_free_curve.period_rate(
+        RISK_FREE_TENOR, stats["first_close"][cols], stats["last_close"][cols], period_days)
+
+    # Calculate performance metrics for all stocks to determine ranks
+    all_metrics = ratios_from_moments(
+        stock_returns, stock_returns[market_idx], stats["beta"][cols], stats["volatility"][cols],
+        stats["n_returns"][cols] > 1, period_days, RISK_FREE_RATE, period_risk_free_rate)
+    performance_metrics = {name: float(values[stock_idx]) for name, values in all_metrics.items()}
+
+    ranked = np.flatnonzero(has_data)
+    ranked_position = int(np.flatnonzero(ranked == stock_idx)[0])
+    alpha_rank = rank_descending(all_metrics["alpha"][ranked], ranked_position)
+    beta_rank = rank_descending(all_metrics["beta"][ranked], ranked_position)
+    sharpe_rank = rank_descending(all_metrics["sharpe_ratio"][ranked], ranked_position)
+    treynor_rank = rank_descending(all_metrics["treynor_ratio"][ranked], ranked_position)
+
+    market_alpha = 0
+    market_beta = 1
+    market_sharpe_ratio = float(all_metrics["sharpe_ratio"][market_idx])
+    market_treynor_ratio = float(all_metrics["treynor_ratio"][market_idx])
+
+    daily = daily_returns(price_store.panel["Close"][lo:hi, cols])
+    correlation_data = calculate_correlation_panel(request.stock_ticker, universe, daily)
+    
+    response = {
+        "performance": {
+            "alpha": performance_metrics["alpha"],
+            "alpha_rank": alpha_rank,
+            "market_alpha": market_alpha,
+            "beta": performance_metrics["beta"],
+            "beta_rank": beta_rank,
+            "market_beta": market_beta,
+            "sharpe_ratio": performance_metrics["sharpe_ratio"],
+            "sharpe_ratio_rank": sharpe_rank,
+            "market_sharpe_ratio": market_sharpe_ratio,
+            "treynor_ratio": performance_metrics["treynor_ratio"],
+            "treynor_ratio_rank": treynor_rank,
+            "market_treynor_ratio": market_treynor_ratio
+        },
+        "correlation": correlation_data
+    }
+
+    return response
+
 @app.post("/api/calculate")
 async def calculate(request: StockRequest):
     try:
-        # Load data
-        stock_data = load_stock_data(request.stock_ticker, request.start_date, request.end_date)
-        market_data = load_stock_data("SPY", request.start_date, request.end_date)
-        
-        # Calculate total returns over the period
-        stock_return = calculate_returns(stock_data)
-        market_return = calculate_returns(market_data)
-        
-        # Calculate performance metrics for the requested stock
-        performance_metrics = calculate_performance_metrics(stock_return, market_return, stock_data, market_data)
-        
-        # Calculate performance metrics for all stocks to determine ranks
-        all_metrics = {}
-        all_returns = {}
-        all_stocks_data = {}
-        
-        for ticker in STOCK_TICKERS:
-            if ticker == request.stock_ticker:
-                continue
-                
-            try:
-                ticker_data = load_stock_data(ticker, request.start_date, request.end_date)
-                ticker_return = calculate_returns(ticker_data)
-                all_returns[ticker] = ticker_return
-                all_stocks_data[ticker] = ticker_data
-                
-                metrics = calculate_performance_metrics(ticker_return, market_return, ticker_data, market_data)
-                all_metrics[ticker] = metrics
-            except Exception:
-                # Skip stocks with missing data
-                continue
-        
-        # Calculate ranks
-        combined_metrics = all_metrics.copy()
-        combined_metrics[request.stock_ticker] = performance_metrics
-        
-        alphas = {ticker: metrics["alpha"] for ticker, metrics in combined_metrics.items()}
-        betas = {ticker: metrics["beta"] for ticker, metrics in combined_metrics.items()}
-        sharpe_ratios = {ticker: metrics["sharpe_ratio"] for ticker, metrics in combined_metrics.items()}
-        treynor_ratios = {ticker: metrics["treynor_ratio"] for ticker, metrics in combined_metrics.items()}
-        market_alpha = 0
-        market_beta = 1
-        market_sharpe_ratio = combined_metrics.get("SPY", {"sharpe_ratio": 0})["sharpe_ratio"]
-        market_treynor_ratio = combined_metrics.get("SPY", {"treynor_ratio": 0})["treynor_ratio"]
-
-        alpha_rank = sorted(alphas.keys(), key=lambda x: alphas[x], reverse=True).index(request.stock_ticker) + 1 if request.stock_ticker in alphas else 0
-        beta_rank = sorted(betas.keys(), key=lambda x: betas[x], reverse=True).index(request.stock_ticker) + 1 if request.stock_ticker in betas else 0
-        sharpe_rank = sorted(sharpe_ratios.keys(), key=lambda x: sharpe_ratios[x], reverse=True).index(request.stock_ticker) + 1 if request.stock_ticker in sharpe_ratios else 0
-        treynor_rank = sorted(treynor_ratios.keys(), key=lambda x: treynor_ratios[x], reverse=True).index(request.stock_ticker) + 1 if request.stock_ticker in treynor_ratios else 0
-        
-        all_stocks_data[request.stock_ticker] = stock_data
-        correlation_data = calculate_correlation(request.stock_ticker, stock_data, all_stocks_data)
-        
-        response = {
-            "performance": {
-                "alpha": performance_metrics["alpha"],
-                "alpha_rank": alpha_rank,
-                "market_alpha": market_alpha,
-                "beta": performance_metrics["beta"],
-                "beta_rank": beta_rank,
-                "market_beta": market_beta,
-                "sharpe_ratio": performance_metrics["sharpe_ratio"],
-                "sharpe_ratio_rank": sharpe_rank,
-                "market_sharpe_ratio": market_sharpe_ratio,
-                "treynor_ratio": performance_metrics["treynor_ratio"],
-                "treynor_ratio_rank": treynor_rank,
-                "market_treynor_ratio": market_treynor_ratio
-            },
-            "correlation": correlation_data
+        key = make_key("calculate", request.stock_ticker, request.start_date, request.end_date)
+        return cached_response(key, lambda: calculate_metrics(request))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+def rolling_series(tickers: List[str], window: int) -> Dict[str, Dict[str, np.ndarray]]:
+    # rolling metrics of every panel day for the tickers, the ones not cached yet are computed together
+    missing = [ticker for ticker in tickers if (ticker, window) not in rolling_series_cache]
+    if missing:
+        # SPY goes last, its return is the market return of the alpha inside ratios_from_moments
+        cols = [price_store.ticker_index[ticker] for ticker in missing] + [moment_index.market_col]
+        stats = moment_index.rolling_stats(window, cols)
+        # a value is only reported for a full window: beta and correlation need all `window` returns paired
+        # with SPY returns, volatility and sharpe ratio only use the stock's own returns
+        full_pairs = stats["n_returns"] == window
+        full_returns = stats["n_stock_returns"] == window
+
+        # sharpe ratio as /api/calculate gives it for the same window, with the treasury risk free rate
+        period_risk_free_rate = risk_free_curve.period_rate(
+            RISK_FREE_TENOR, stats["first_close"], stats["last_close"], stats["period_days"])
+        ratios = ratios_from_moments(
+            stats["stock_return"], stats["stock_return"][:, [-1]], stats["beta"], stats["volatility"],
+            full_returns, stats["period_days"], RISK_FREE_RATE, period_risk_free_rate)
+
+        def masked(values, full):
+            # NaN outside a full window and where a value is not finite, json has no inf
+            return np.where(full & np.isfinite(values), values, np.nan)
+
+        series = {
+            "beta": masked(stats["beta"], full_pairs),
+            "volatility": masked(stats["volatility"] * np.sqrt(TRADING_DAYS), full_returns), # annualized
+            "sharpe_ratio": masked(ratios["sharpe_ratio"], full_returns),
+            "correlation": masked(stats["correlation"], full_pairs),
         }
-        
-        return response
-        
+        for i, ticker in enumerate(missing):
+            rolling_series_cache[(ticker, window)] = {name: values[:, i] for name, values in series.items()}
+    return {ticker: rolling_series_cache[(ticker, window)] for ticker in tickers}
+
+def nan_to_none(values: np.ndarray) -> list:
+    # json has no NaN, the elementwise float() / isnan of a list comprehension is slow for long series
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+def calculate_rolling_metrics(tickers: List[str], windows: List[int], start_date: str, end_date: str) -> dict:
+    lo, hi = price_store.window(start_date, end_date)
+    series = {ticker: {} for ticker in tickers}
+    for window in windows:
+        for ticker, metrics in rolling_series(tickers, window).items():
+            series[ticker][str(window)] = {
+                name: nan_to_none(values[lo:hi]) for name, values in metrics.items()
+            }
+    return {
+        "dates": [date.isoformat() for date in price_store.dates[lo:hi]],
+        "series": series,
+    }
+
+@app.post("/api/rolling_metrics")
+async def rolling_metrics_endpoint(request: RollingMetricsRequest):
+    # rolling beta, annualized volatility, sharpe ratio and correlation to SPY of one or more stocks,
+    # one value per trading day in the date range for every window, the windows look back before start_date
+    tickers = list(dict.fromkeys(request.tickers))
+    windows = list(dict.fromkeys(request.windows or ROLLING_WINDOWS))
+    for ticker in tickers:
+        if ticker not in price_store:
+            raise HTTPException(status_code=404, detail=f"Stock data for {ticker} not found")
+    for window in windows:
+        if window not in ROLLING_WINDOWS:
+            raise HTTPException(status_code=400, detail=f"Rolling windows can only be {ROLLING_WINDOWS}")
+    try:
+        key = make_key("rolling_metrics", ",".join(tickers), request.start_date, request.end_date,
+                       windows=tuple(windows))
+        return cached_response(key, lambda: calculate_rolling_metrics(tickers, windows, request.start_date, request.end_date))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@app.post("/api/sentiment")
+async def sentiment_endpoint(request: SentimentRequest):
+    # sentiment score of every text with the fine tuned BERTweet regressor, same scale as the Score column
+    if len(request.texts) > MAX_SENTIMENT_TEXTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SENTIMENT_TEXTS} texts per request")
+    if not request.texts:
+        return {"scores": []}
+    try:
+        scores = await sentiment_batcher.score(request.texts)
+    except (ImportError, OSError) as e:
+        # torch / transformers not installed or no checkpoint at SENTIMENT_CHECKPOINT_PATH
+        raise HTTPException(status_code=503, detail=f"Sentiment model unavailable: {str(e)}")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+    return {"scores": scores}
+
+@app.get("/api/sentiment/stats")
+async def sentiment_stats():
+    # queue depth, batch size histogram and score cache hit rate of the sentiment micro batcher
+    return sentiment_batcher.stats()
+
+@app.get("/api/cache_stats")
+async def cache_stats():
+    # hit/miss counters of the response cache
+    return response_cache.stats()
 
 
 if __name__ == "__main__":
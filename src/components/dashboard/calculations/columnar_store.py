@@ -0,0 +1,80 @@
+# binary columnar copies of the clean_data csvs, written by convert_to_columnar.py
+# every ticker gets a directory with one .npy file per numeric column (read back memory mapped, no parsing)
+# and a .txt file per string list (one string per line), plus a meta.json written last
+# meta.json remembers the size and mtime of the csv it was made from, if the csv changed since then
+# the columns are treated as missing and the loaders go back to reading the csv
+#
+#   clean_data/stock_data/F.csv  ->  clean_data/stock_data_columnar/F/{Date,Open,...}.npy + meta.json
+
+import json
+import os
+import numpy as np
+from typing import Dict, List, Optional, Union
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+Column = Union[np.ndarray, List[str]]
+
+
+def columnar_dir(data_dir: str) -> str:
+    # clean_data/stock_data -> clean_data/stock_data_columnar
+    return os.path.normpath(data_dir) + "_columnar"
+
+
+def ticker_dir(data_dir: str, ticker: str) -> str:
+    return os.path.join(columnar_dir(data_dir), ticker)
+
+
+def _source_stamp(source_path: str) -> dict:
+    stat = os.stat(source_path)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+def write_columns(out_dir: str, source_path: str, columns: Dict[str, Column], **extra):
+    # extra are small json values that read_columns has to find unchanged (e.g. a version of a mapping)
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # half written columns must never look valid
+
+    kinds = {}
+    for name, values in columns.items():
+        kind = "npy" if isinstance(values, np.ndarray) else "txt"
+        path = os.path.join(out_dir, f"{name}.{kind}")
+        # write next to the old file and swap it in, a server may still have the old one memory mapped
+        with open(path + ".tmp", "wb") as f:
+            if kind == "npy":
+                np.save(f, values, allow_pickle=False)
+            else:
+                f.write("\n".join(values).encode("utf-8"))
+        os.replace(path + ".tmp", path)
+        kinds[name] = kind
+
+    meta = {"format": FORMAT_VERSION, "columns": kinds, "extra": extra, **_source_stamp(source_path)}
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+
+
+def read_columns(out_dir: str, source_path: str, **extra) -> Optional[Dict[str, Column]]:
+    # None if there is no (complete, up to date) columnar copy of source_path
+    meta_path = os.path.join(out_dir, META_FILE)
+    if not os.path.exists(meta_path) or not os.path.exists(source_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    stamp = _source_stamp(source_path)
+    if (meta.get("format") != FORMAT_VERSION or meta.get("extra") != extra
+            or any(meta.get(key) != value for key, value in stamp.items())):
+        return None
+
+    columns = {}
+    for name, kind in meta["columns"].items():
+        path = os.path.join(out_dir, f"{name}.{kind}")
+        if kind == "npy":
+            columns[name] = np.load(path, mmap_mode="r", allow_pickle=False)
+        else:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            columns[name] = text.split("\n") if text else []
+    return columns
@@ -0,0 +1,61 @@
+# writes the columnar copies of the clean_data csvs read by price_store.py and tweet_corpus.py
+# run from the repo root after the cleaning scripts, e.g.
+#   python src/components/dashboard/calculations/convert_to_columnar.py
+#   python src/components/dashboard/calculations/convert_to_columnar.py --tickers F DIS --skip-stocks
+# the output goes next to the csv dirs (clean_data/stock_data_columnar, clean_data/twit_data/non_neutral_columnar),
+# the stock dir also gets the combined price panel PriceStore memory maps (stock_data_columnar/_panel)
+# and is rebuilt whenever a csv changes, the loaders ignore copies older than their csv
+
+import argparse
+import os
+import time
+from columnar_store import columnar_dir, ticker_dir, write_columns
+from price_store import panel_dir, price_columns, read_price_csv, write_panel
+from tweet_corpus import TweetCorpus, WORD_MAPPING_DIGEST
+
+STOCK_DATA_PATH = "clean_data/stock_data"
+TWEET_DATA_DIR = "clean_data/twit_data/non_neutral"
+
+
+def csv_tickers(data_dir, tickers=None):
+    names = sorted(os.path.splitext(f)[0] for f in os.listdir(data_dir) if f.endswith(".csv"))
+    return [name for name in names if tickers is None or name in tickers]
+
+
+def convert_stocks(data_dir, tickers=None):
+    for ticker in csv_tickers(data_dir, tickers):
+        file_path = os.path.join(data_dir, f"{ticker}.csv")
+        df = read_price_csv(file_path)  # always from the csv, never from the copy being replaced
+        write_columns(ticker_dir(data_dir, ticker), file_path, price_columns(df))
+        print(f"{ticker}: {len(df)} days")
+    # the combined panel of all tickers, from the copies just written
+    tickers, dates = write_panel(data_dir)
+    print(f"panel of {len(tickers)} tickers x {len(dates)} days written to {panel_dir(data_dir)}")
+
+
+def convert_tweets(data_dir, tickers=None):
+    for ticker in csv_tickers(data_dir, tickers):
+        file_path = os.path.join(data_dir, f"{ticker}.csv")
+        corpus = TweetCorpus.from_csv(ticker, file_path)
+        columns = corpus.columns()
+        write_columns(ticker_dir(data_dir, ticker), file_path, columns, word_mapping=WORD_MAPPING_DIGEST)
+        print(f"{ticker}: {len(corpus)} tweets, {len(corpus.vocab)} words, scores as {columns['scores'].dtype}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="convert the clean_data csvs to memory mappable columnar files")
+    parser.add_argument("--stock-dir", default=STOCK_DATA_PATH)
+    parser.add_argument("--tweet-dir", default=TWEET_DATA_DIR)
+    parser.add_argument("--tickers", nargs="*", help="only these tickers (default: every csv)")
+    parser.add_argument("--skip-stocks", action="store_true")
+    parser.add_argument("--skip-tweets", action="store_true")
+    args = parser.parse_args()
+
+    start = time.time()
+    if not args.skip_stocks:
+        convert_stocks(args.stock_dir, args.tickers)
+        print(f"stock data written to {columnar_dir(args.stock_dir)}")
+    if not args.skip_tweets:
+        convert_tweets(args.tweet_dir, args.tickers)
+        print(f"tweet data written to {columnar_dir(args.tweet_dir)}")
+    print(f"done in {time.time() - start:.1f}s")
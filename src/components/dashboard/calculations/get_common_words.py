@@ -1,16 +1,15 @@
-from collections import Counter, defaultdict
-import json
 import os
 import time
 import numpy as np
+from scipy import sparse
 from word_mapping import WORD_MAPPING
+from tweet_corpus import load_corpus
 import pandas as pd
-from itertools import combinations
 
 
 class CommonWords:
     def __init__(self, ticker, data_dir, start_date, end_date,
-                 min_count_percentage=0.01, top_n_words=5, filter_metric='average_score'):
+                 min_count_percentage=0.01, top_n_words=5, filter_metric='average_score', corpus=None):
         self.ticker = ticker
         self.data_dir = data_dir
         self.start_date = pd.to_datetime(start_date).tz_localize("UTC")
@@ -19,7 +18,8 @@ class CommonWords:
         self.top_n_words = top_n_words
         self.filter_metric = filter_metric
 
-        self.df = self._load_data()
+        # corpus is a preloaded TweetCorpus (tweet_corpus.py), without one the ticker is loaded here
+        self.corpus = corpus if corpus is not None else self._load_data()
         self.common_words = {}  
 
     def _load_data(self):
@@ -27,64 +27,62 @@ class CommonWords:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"GOD DAMN TICKER DOES NOT EXIST '{self.ticker}': {file_path}")
         
-        ### CHECK FOR MISSING SHIT
-        df = pd.read_csv(file_path,usecols=["Tweet_Words", "Created_at", "Score"]
-                         )
-        # print(df.isna().sum(), 'total na')
-        df.dropna( inplace=True)
-        df["Tweet_Words"] = df["Tweet_Words"].str.split()
-        df["Created_at"] = pd.to_datetime(df["Created_at"], utc=True)
-        
-        df["Tweet_Words"] = df["Tweet_Words"].apply(
-            lambda words: [WORD_MAPPING.get(word, word) for word in words]) # dont know why, but this seems to work better
-
-        
-        return df
+        # words are mapped with WORD_MAPPING when loading, dont know why, but this seems to work better
+        return load_corpus(self.data_dir, self.ticker)
+
+    def _score_sums(self, lo, hi, word_ids):
+        # sum of the scores of the tweets in [lo, hi) containing each word (ids of corpus.mapped_vocab)
+        # rows go back to csv order so the scores add up in the same order as the old per tweet loop,
+        # the float sums (and the ties between words in the same tweets) come out exactly as before
+        num_tweets = hi - lo
+        file_order = np.argsort(self.corpus.file_rows[lo:hi], kind="stable")
+        row_of = np.empty(num_tweets, dtype=np.int64)
+        row_of[file_order] = np.arange(num_tweets)
+
+        column_of = np.full(len(self.corpus.mapped_vocab), -1)
+        column_of[word_ids] = np.arange(len(word_ids))
+        tokens = self.corpus.tokens[self.corpus.offsets[lo]:self.corpus.offsets[hi]]
+        columns = column_of[self.corpus.mapped_ids[tokens]]
+        rows = row_of[np.repeat(np.arange(num_tweets), np.diff(self.corpus.offsets[lo:hi + 1]))]
+        keep = columns >= 0
+        X = sparse.csr_matrix(
+            (np.ones(keep.sum(), dtype=np.int64), (rows[keep], columns[keep])),
+            shape=(num_tweets, len(word_ids)))
+        X.data[:] = 1  # duplicates got summed
+        return X.T @ self.corpus.scores[lo:hi][file_order]
 
     def calculate(self, ):
         # os.makedirs(output_dir, exist_ok=True)
 
-        tweets = self.df[(self.df["Created_at"] >= self.start_date) &
-                         (self.df["Created_at"] <= self.end_date)]
-        num_tweets = len(tweets)
+        lo, hi = self.corpus.window(self.start_date, self.end_date)
+        num_tweets = hi - lo
         if num_tweets == 0:
             print(f"no tweets for {self.ticker} between {self.start_date.date()} and {self.end_date.date()}")
             return
 
         self.min_count = max(1, int(num_tweets * self.min_count_percentage))
 
-        words_list = tweets["Tweet_Words"].tolist()
-        scores_list = tweets["Score"].tolist()
-
         # ------------ compute word counts and total scores -----------
-        # start_first_pass = time.perf_counter()
-        word_counts = Counter()
-        word_scores = defaultdict(float)
-
-        for words, score in zip(words_list, scores_list):
-            if not words: continue
-                
-            mapped_words = set(WORD_MAPPING.get(word, word) for word in words)
-            word_counts.update(mapped_words)
-            for word in mapped_words:
-                word_scores[word] += score
-
-        self.common_words = {
-            word: {"counts": count, "total_score": word_scores[word]}
-            for word, count in word_counts.items()}
-        
-        # end_first_pass = time.perf_counter()
-        # print(f"first pass done in {end_first_pass - start_first_pass} seconds")
+        # a word counts once per tweet like the sets did before
+        # words get mapped with WORD_MAPPING again here, the corpus keeps the ids of that second mapping
+        if self.corpus.count_index is not None:
+            # precomputed day buckets, only the partial days at the edges are counted here
+            word_counts = self.corpus.count_index.window_counts(lo, hi)
+        else:
+            word_counts = np.asarray(self.corpus.word_matrix(lo, hi).sum(axis=0)).ravel().astype(np.int64)
+
+        seen = np.flatnonzero(word_counts)
+        df_words = pd.DataFrame({
+            "word": [self.corpus.mapped_vocab[i] for i in seen],
+            "counts": word_counts[seen].astype(np.int64)})
 
         # candidate word selection
-        # start_candidate_selection = time.perf_counter()
-
-        df_words = pd.DataFrame.from_dict(self.common_words,orient='index')
-        df_words["average_score"] = df_words["total_score"]  / df_words["counts"]
-        df_words.reset_index(inplace=True)
-        df_words.rename(columns={"index" : "word"}, inplace=True)
-
         df_words["word"] = df_words["word"].apply(lambda w : WORD_MAPPING.get(w, w))
+
+        # scores are only summed for the words that can pass the min_count filter
+        kept = (df_words.groupby("word")["counts"].transform("sum") >= self.min_count).to_numpy()
+        df_words["total_score"] = 0.0
+        df_words.loc[kept, "total_score"] = self._score_sums(lo, hi, seen[kept])
         df_words = df_words.groupby("word", as_index=False).agg({"counts" : "sum","total_score": "sum"})
         df_words["average_score"] = df_words["total_score"]/df_words["counts"]
 
@@ -99,71 +97,37 @@ class CommonWords:
         candidate_words = set(top_words["word"]) | set(bottom_words["word"])
         # print(f"final words: {sorted(candidate_words)}")
 
-        # end_candidate_selection = time.perf_counter()
-
-
         # second pass: get co-occurrences for candidate words only MUCH FASTER
-        # start_second_pass = time.perf_counter()
-        cooccurrence = defaultdict(lambda : defaultdict(int))
-        for words in words_list:
-            if not words: continue
-            
-            unique_words = set(words)
-            filtered_words = unique_words.intersection(candidate_words)
-            
-            for w1, w2 in combinations(filtered_words, 2):
-                if w1 > w2:
-                    w1, w2 = w2, w1
-                cooccurrence[w1][w2] += 1
-        # end_second_pass = time.perf_counter()
-        # print(f"second pass done in {end_second_pass - start_second_pass} seconds")
-
-        # build adjacency matrix
-        # start_adj_matrix = time.perf_counter()
-        matrix_json = {}
-
-        for w1, neighbors in cooccurrence.items():
-            if w1 in candidate_words:
-                filtered_neighbors = {}
-                for w2, count in neighbors.items():
-                    if w2 in candidate_words:
-                        filtered_neighbors[w2] = count
-                matrix_json[w1] = filtered_neighbors
-
-        # end_adj_matrix = time.perf_counter()
-        # print(f"adj matrix done in {end_adj_matrix - start_adj_matrix} seconds")
-
-
-
-        ######################
-        ######################
-                ######################
-        ######################
-                ######################
-        ###################### REMOVE WORDS THAT OCCUR OFTEN BUT NOT IN ADJ Matrix
-                ######################
-        ######################
-                ######################
-        ######################
-
-
-        # apply word mapping
-        word_pass_start = time.perf_counter()
+        # only the candidate columns of the (single mapped) tweet words are kept, C[i, j] = tweets with both words
+        tokens = self.corpus.tokens[self.corpus.offsets[lo]:self.corpus.offsets[hi]]
+        offsets = self.corpus.offsets[lo:hi + 1] - self.corpus.offsets[lo]
         final_words = sorted(candidate_words)
+        if not final_words:
+            # no word reaches min_count (or top_n_words is 0)
+            return [], [], {}
+        candidate_ids = np.array([self.corpus.word_ids.get(w, -1) for w in final_words], dtype=np.int64)
+        column_of = np.full(len(self.corpus.vocab), -1)
+        column_of[candidate_ids[candidate_ids >= 0]] = np.flatnonzero(candidate_ids >= 0)
+        candidate_tokens = column_of[tokens]
+        tweet_of = np.repeat(np.arange(num_tweets), np.diff(offsets))
+        keep = candidate_tokens >= 0
+        X_c = sparse.csr_matrix(
+            (np.ones(keep.sum(), dtype=np.int64), (tweet_of[keep], candidate_tokens[keep])),
+            shape=(num_tweets, len(final_words)))
+        X_c.data[:] = 1  # duplicates got summed
+        cooccurrence = (X_c.T @ X_c).toarray()
+
+        # build adjacency matrix and apply word mapping
         mapped_matrix = {}
 
-        for w1 in final_words:
+        for i, w1 in enumerate(final_words):
             mapped_w1 = WORD_MAPPING.get(w1, w1)
             mapped_matrix[mapped_w1] = {}
-            for w2 in final_words:
+            for j, w2 in enumerate(final_words):
                 if w1 == w2:continue  # skip self links
                 
                 mapped_w2 = WORD_MAPPING.get(w2, w2)
-                count = matrix_json.get(w1, {}).get(w2, matrix_json.get(w2, {}).get(w1, 0))
-                mapped_matrix[mapped_w1][mapped_w2] = count
-
-        word_pass_end = time.perf_counter()
-        # print(f"word mapping done in {word_pass_end - word_pass_start} seconds")
+                mapped_matrix[mapped_w1][mapped_w2] = int(cooccurrence[i, j])
 
         return top_words.to_dict(orient="records"),bottom_words.to_dict(orient="records"),mapped_matrix
 
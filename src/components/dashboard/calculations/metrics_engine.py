@@ -0,0 +1,85 @@
+# numpy metric math shared by the endpoints in calculation_api.py
+# ratios_from_moments turns per ticker window numbers (returns, beta, volatility from moment_index.py)
+# into alpha, beta, sharpe and treynor for every ticker at once
+# pairwise_correlation / correlation_matrix correlate the columns of aligned (days x tickers) return panels
+
+import numpy as np
+from typing import Dict
+
+TRADING_DAYS = 252
+
+
+def daily_returns(closes: np.ndarray) -> np.ndarray:
+    # (days - 1 x tickers) simple returns, NaN where a ticker has no price on either day
+    return closes[1:] / closes[:-1] - 1
+
+
+def ratios_from_moments(stock_return, market_return, beta, volatility, has_returns,
+                        period_days, risk_free_rate: float, period_risk_free_rate=None) -> Dict[str, np.ndarray]:
+    # the part of the calculation that only needs the window's summary numbers,
+    # shared by everything that can produce beta and volatility per ticker
+    # period_risk_free_rate: risk free return of each ticker's window (risk_free.py), when not given
+    # the constant annual risk_free_rate is scaled to the window's days
+    if period_risk_free_rate is None:
+        period_days = np.maximum(period_days, 1)  # default to 1 if no data available
+        period_risk_free_rate = risk_free_rate * (period_days / TRADING_DAYS)
+
+    excess_stock_return = stock_return - period_risk_free_rate
+
+    beta = np.where(has_returns, beta, 1.0)
+    alpha = stock_return - (period_risk_free_rate + beta * (market_return - period_risk_free_rate))
+
+    annualized_volatility = volatility * np.sqrt(TRADING_DAYS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe_ratio = np.where(
+            has_returns,
+            np.where(annualized_volatility != 0, excess_stock_return / annualized_volatility, 0.0),
+            np.where(period_risk_free_rate != 0, excess_stock_return / period_risk_free_rate, 0.0))
+        treynor_ratio = np.where(beta != 0, excess_stock_return / beta, 0.0)
+
+    return {
+        "alpha": alpha,
+        "beta": beta,
+        "sharpe_ratio": sharpe_ratio,
+        "treynor_ratio": treynor_ratio,
+    }
+
+
+def rank_descending(values: np.ndarray, position: int) -> int:
+    # 1 based rank of values[position] when sorted from high to low, ties keep their order
+    order = np.argsort(-values, kind="stable")
+    return int(np.flatnonzero(order == position)[0]) + 1
+
+
+def _masked_moments(returns: np.ndarray):
+    valid = ~np.isnan(returns)
+    return np.where(valid, returns, 0.0), valid.astype(np.float64)
+
+
+def pairwise_correlation(left: np.ndarray, right: np.ndarray, min_periods: int = 5) -> np.ndarray:
+    """
+    pearson correlation between every column of left (days x a) and every column of right (days x b)
+    using only the days where both columns have a return (pairwise complete), all with matrix products
+    pairs with fewer than min_periods common days are NaN
+    """
+    x, mx = _masked_moments(left)
+    y, my = _masked_moments(right)
+
+    n = mx.T @ my                # common days per pair
+    sum_x = x.T @ my             # sum of left over the common days
+    sum_y = mx.T @ y             # sum of right over the common days
+    sum_xx = (x * x).T @ my
+    sum_yy = mx.T @ (y * y)
+    sum_xy = x.T @ y
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        numerator = n * sum_xy - sum_x * sum_y
+        denominator = np.sqrt((n * sum_xx - sum_x ** 2) * (n * sum_yy - sum_y ** 2))
+        corr = numerator / denominator
+    corr[n < min_periods] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlation_matrix(returns: np.ndarray, min_periods: int = 5) -> np.ndarray:
+    # full (tickers x tickers) correlation matrix of a return panel
+    return pairwise_correlation(returns, returns, min_periods)
@@ -0,0 +1,159 @@
+# prefix sum (cumulative moment) index over the price store
+# daily returns never change, so the running sums of returns, squared returns and cross products
+# with the market (SPY) returns are computed once at startup
+# the sums for any [start_date, end_date] window are then two lookups and a subtraction,
+# which gives beta, volatility and correlation to the market without touching the window's rows
+# rolling windows (rolling_stats) are the same differences taken between shifted slices of the prefix sums,
+# so the series for every end day of a ticker is O(days) whatever the window length
+
+import numpy as np
+from typing import Dict, List
+from price_store import PriceStore
+
+
+def _prefix(values: np.ndarray) -> np.ndarray:
+    # prefix[k] = sum of rows < k, with a leading row of zeros
+    prefix = np.zeros((values.shape[0] + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=prefix[1:])
+    return prefix
+
+
+class MomentIndex:
+    def __init__(self, store: PriceStore, market_ticker: str = "SPY"):
+        self.store = store
+        self.market_col = store.ticker_index[market_ticker]
+
+        closes = store.panel["Close"]
+        days = len(closes)
+        valid_close = ~np.isnan(closes)
+
+        # returns[d] is the return from day d - 1 to day d, row 0 has no previous day
+        returns = np.full(closes.shape, np.nan)
+        returns[1:] = closes[1:] / closes[:-1] - 1
+        market = returns[:, [self.market_col]]
+
+        stock_valid = ~np.isnan(returns)
+        pair_valid = stock_valid & ~np.isnan(market)
+        x = np.where(stock_valid, returns, 0.0)
+        xp = np.where(pair_valid, returns, 0.0)
+        mp = np.where(pair_valid, market, 0.0)
+
+        self.close_count = _prefix(valid_close.astype(np.float64))
+        self.n_stock = _prefix(stock_valid.astype(np.float64))
+        self.sum_x = _prefix(x)
+        self.sum_xx = _prefix(x * x)
+        self.n_pair = _prefix(pair_valid.astype(np.float64))
+        self.sum_xp = _prefix(xp)
+        self.sum_xxp = _prefix(xp * xp)
+        self.sum_mp = _prefix(mp)
+        self.sum_mmp = _prefix(mp * mp)
+        self.sum_xm = _prefix(xp * mp)
+
+        # first valid close at or after day d / last valid close at or before day d, per ticker
+        rows = np.arange(days)[:, None]
+        self.prev_valid = np.maximum.accumulate(np.where(valid_close, rows, -1), axis=0)
+        self.next_valid = np.minimum.accumulate(np.where(valid_close, rows, days)[::-1], axis=0)[::-1]
+
+    def window_stats(self, lo: int, hi: int) -> Dict[str, np.ndarray]:
+        """
+        statistics for panel rows [lo, hi) (see PriceStore.window) for every ticker
+        the returns inside the window are rows lo + 1 .. hi - 1, the first day has no return in the window
+        """
+        closes = self.store.panel["Close"]
+        n_tickers = closes.shape[1]
+        r_lo = min(lo + 1, hi)
+
+        def window_sum(prefix, start=r_lo):
+            return prefix[hi] - prefix[start]
+
+        period_days = window_sum(self.close_count, lo)
+
+        # total return from the first to the last valid close in the window
+        cols = np.arange(n_tickers)
+        stock_return = np.full(n_tickers, np.nan)
+        first = np.full(n_tickers, lo)
+        last = np.full(n_tickers, hi - 1)
+        if hi > lo:
+            first = self.next_valid[lo]
+            last = self.prev_valid[hi - 1]
+            has_close = period_days > 0
+            stock_return[has_close] = closes[last[has_close], cols[has_close]] / closes[first[has_close], cols[has_close]] - 1
+
+        moments = _moments(window_sum, (self.n_stock, self.n_pair, self.sum_x, self.sum_xx, self.sum_xp,
+                                        self.sum_xxp, self.sum_mp, self.sum_mmp, self.sum_xm))
+
+        return {
+            "stock_return": stock_return,
+            "period_days": period_days.astype(np.int64),
+            # rows of the first / last close in the window, only meaningful where period_days > 0
+            "first_close": first,
+            "last_close": last,
+            **moments,
+        }
+
+    def rolling_stats(self, window: int, cols: List[int]) -> Dict[str, np.ndarray]:
+        """
+        window_stats of the last `window` returns (window + 1 closes) ending at every panel row,
+        for the tickers in cols, as (days x len(cols)) arrays: row e is window_stats(e - window, e + 1)
+        rows before the first full window are NaN (0 for the counts)
+        """
+        closes = self.store.panel["Close"][:, cols]
+        days = closes.shape[0]
+        ends = max(days - window, 0)  # number of end rows that have a full window
+
+        def window_sum(prefix, start=1):
+            # prefix[e + 1] - prefix[e - window + start] for every end row e >= window at once
+            prefix = prefix[:, cols]
+            return prefix[window + 1:] - prefix[start:start + ends]
+
+        period_days = window_sum(self.close_count, 0)
+        moments = _moments(window_sum, (self.n_stock, self.n_pair, self.sum_x, self.sum_xx, self.sum_xp,
+                                        self.sum_xxp, self.sum_mp, self.sum_mmp, self.sum_xm))
+
+        # total return from the first to the last valid close of every window
+        has_close = period_days > 0
+        first = np.where(has_close, self.next_valid[:ends, cols], 0)
+        last = np.where(has_close, self.prev_valid[window:, cols], 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stock_return = np.where(has_close, np.take_along_axis(closes, last, axis=0) /
+                                    np.take_along_axis(closes, first, axis=0) - 1, np.nan)
+
+        def padded(values, fill):
+            # back to one row per panel day
+            out = np.full((days, len(cols)), fill, dtype=values.dtype)
+            out[days - ends:] = values
+            return out
+
+        return {
+            "stock_return": padded(stock_return, np.nan),
+            "period_days": padded(period_days.astype(np.int64), 0),
+            "first_close": padded(first, 0),
+            "last_close": padded(last, 0),
+            **{name: padded(values, 0 if name.startswith("n_") else np.nan) for name, values in moments.items()},
+        }
+
+
+def _moments(window_sum, prefixes) -> Dict[str, np.ndarray]:
+    # beta, volatility and correlation from the window sums of the MomentIndex prefixes
+    n_stock, n_pair, sum_x, sum_xx, sum_xp, sum_xxp, sum_mp, sum_mmp, sum_xm = map(window_sum, prefixes)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # beta: sample covariance (ddof=1) over population market variance (ddof=0), like np.cov / np.var
+        covariance = (sum_xm - sum_xp * sum_mp / n_pair) / (n_pair - 1)
+        market_variance = (sum_mmp - sum_mp ** 2 / n_pair) / n_pair
+        beta = covariance / market_variance
+
+        # population std of all of the stock's returns in the window
+        mean_x = sum_x / n_stock
+        volatility = np.sqrt(np.maximum(sum_xx / n_stock - mean_x ** 2, 0.0))
+
+        correlation = (n_pair * sum_xm - sum_xp * sum_mp) / np.sqrt(
+            (n_pair * sum_xxp - sum_xp ** 2) * (n_pair * sum_mmp - sum_mp ** 2))
+
+    return {
+        "n_returns": n_pair.astype(np.int64),  # returns paired with a market return, used by beta / correlation
+        "n_stock_returns": n_stock.astype(np.int64),  # all of the stock's returns, used by volatility
+        "beta": beta,
+        "volatility": volatility,
+        "correlation": np.clip(correlation, -1.0, 1.0),
+    }
@@ -0,0 +1,133 @@
+# in-memory store for the daily stock prices used by calculation_api.py
+# every csv in the stock data dir is read once when the api starts and kept as one
+# date aligned panel (days x tickers) per price field, so requests never touch the disk
+# date ranges are found with a binary search (searchsorted) on the sorted dates
+# a columnar copy of a csv (convert_to_columnar.py) is read instead of the csv when it is up to date,
+# and when the whole panel was saved (write_panel) and no csv changed since, it is memory mapped as is
+
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from columnar_store import columnar_dir, read_columns, ticker_dir, write_columns
+
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+PANEL_DIR = "_panel"  # in the columnar dir, next to the ticker dirs
+
+
+def read_price_csv(file_path: str) -> pd.DataFrame:
+    df = pd.read_csv(file_path, usecols=["Date"] + PRICE_FIELDS)
+    df["Date"] = pd.to_datetime(df["Date"], utc=True)
+    return df.set_index("Date").sort_index()
+
+
+def load_prices(data_dir: str, ticker: str) -> pd.DataFrame:
+    # one ticker's prices indexed by UTC date
+    file_path = os.path.join(data_dir, f"{ticker}.csv")
+    columns = read_columns(ticker_dir(data_dir, ticker), file_path)
+    if columns is not None:
+        dates = pd.DatetimeIndex(pd.to_datetime(columns["Date"], utc=True), name="Date")
+        return pd.DataFrame({field: columns[field] for field in PRICE_FIELDS}, index=dates).sort_index()
+    return read_price_csv(file_path)
+
+
+def price_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    # columns of a load_prices frame to save, dates as int64 ns since epoch
+    columns = {"Date": df.index.as_unit("ns").asi8.astype(np.int64)}
+    for field in PRICE_FIELDS:
+        columns[field] = df[field].to_numpy()
+    return columns
+
+
+def csv_tickers(data_dir: str) -> List[str]:
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(data_dir) if f.endswith(".csv"))
+
+
+def build_panel(frames: Dict[str, pd.DataFrame]) -> Tuple[List[str], pd.DatetimeIndex, Dict[str, np.ndarray]]:
+    # (tickers, dates, field -> days x tickers) from the load_prices frames of every ticker
+    tickers = list(frames.keys())
+
+    # union of all trading days, tickers missing a day get NaN
+    dates = pd.DatetimeIndex([], tz="UTC")
+    for df in frames.values():
+        dates = dates.union(df.index)
+
+    panel = {}
+    for field in PRICE_FIELDS:
+        aligned = pd.DataFrame({ticker: df[field] for ticker, df in frames.items()}, columns=tickers).reindex(dates)
+        panel[field] = aligned[tickers].to_numpy(dtype=np.float64)
+    return tickers, dates, panel
+
+
+def panel_dir(data_dir: str) -> str:
+    return os.path.join(columnar_dir(data_dir), PANEL_DIR)
+
+
+def _csv_stamps(data_dir: str) -> List[list]:
+    # the saved panel is only valid for exactly these csvs, unchanged
+    stamps = []
+    for ticker in csv_tickers(data_dir):
+        stat = os.stat(os.path.join(data_dir, f"{ticker}.csv"))
+        stamps.append([ticker, stat.st_size, stat.st_mtime_ns])
+    return stamps
+
+
+def write_panel(data_dir: str):
+    # saves the panel of every csv in data_dir for PriceStore to memory map, run after the csvs changed
+    tickers, dates, panel = build_panel({ticker: load_prices(data_dir, ticker) for ticker in csv_tickers(data_dir)})
+    columns = {"tickers": tickers, "Date": dates.as_unit("ns").asi8.astype(np.int64), **panel}
+    write_columns(panel_dir(data_dir), data_dir, columns, sources=_csv_stamps(data_dir))
+    return tickers, dates
+
+
+def read_panel(data_dir: str) -> Optional[Tuple[List[str], pd.DatetimeIndex, Dict[str, np.ndarray]]]:
+    # the panel saved by write_panel, None when there is none or a csv changed since
+    columns = read_columns(panel_dir(data_dir), data_dir, sources=_csv_stamps(data_dir))
+    if columns is None:
+        return None
+    dates = pd.DatetimeIndex(pd.to_datetime(np.asarray(columns["Date"]), utc=True), name="Date")
+    return columns["tickers"], dates, {field: columns[field] for field in PRICE_FIELDS}
+
+
+class PriceStore:
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+
+        saved = read_panel(data_dir)
+        if saved is not None:
+            tickers, dates, panel = saved
+        else:
+            tickers, dates, panel = build_panel({ticker: load_prices(data_dir, ticker) for ticker in csv_tickers(data_dir)})
+
+        self.tickers: List[str] = tickers
+        self.ticker_index: Dict[str, int] = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.dates = dates
+        self.panel: Dict[str, np.ndarray] = panel  # read only, memory mapped when saved
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self.ticker_index
+
+    def window(self, start_date: str, end_date: str) -> Tuple[int, int]:
+        # row range [lo, hi) of the panel with start_date <= Date <= end_date
+        start = pd.to_datetime(start_date, utc=True)
+        end = pd.to_datetime(end_date, utc=True)
+        lo = int(self.dates.searchsorted(start, side="left"))
+        hi = int(self.dates.searchsorted(end, side="right"))
+        return lo, max(lo, hi)
+
+    def closes(self, start_date: str, end_date: str) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        # (days x tickers) close prices for the date range, columns follow self.tickers
+        lo, hi = self.window(start_date, end_date)
+        return self.dates[lo:hi], self.panel["Close"][lo:hi]
+
+    def frame(self, ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
+        # same layout as reading the ticker's csv and filtering it by date
+        col = self.ticker_index[ticker]
+        lo, hi = self.window(start_date, end_date)
+        valid = ~np.isnan(self.panel["Close"][lo:hi, col])
+
+        df = pd.DataFrame({"Date": self.dates[lo:hi][valid]})
+        for field in PRICE_FIELDS:
+            df[field] = self.panel[field][lo:hi, col][valid]
+        df["Volume"] = df["Volume"].astype(np.int64)
+        return df
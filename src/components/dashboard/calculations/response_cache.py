@@ -0,0 +1,81 @@
+# small in-process response cache for the FastAPI endpoints in calculation_api.py
+# the endpoints are pure functions of their request bodies over static data, so the encoded json
+# of a response can be kept and sent back as is for the same request
+# entries are evicted least recently used first once the total size goes over max_bytes,
+# and optionally expire after ttl_seconds
+
+import threading
+import time
+import pandas as pd
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+def normalize_date(date: str) -> str:
+    # "2017-01-01" and "2017-01-01T00:00:00" should be the same key, naive dates are read as UTC like the api does
+    return pd.to_datetime(date, utc=True).isoformat()
+
+
+def make_key(endpoint: str, ticker: str, start_date: str, end_date: str, **params) -> Tuple:
+    return (endpoint, ticker, normalize_date(start_date), normalize_date(end_date)) + tuple(sorted(params.items()))
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (body, expires_at)
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return  # would evict everything else and still not fit
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, expires_at)
+            self.size_bytes += len(body)
+            while self.size_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        body, _ = self._entries.pop(key)
+        self.size_bytes -= len(body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
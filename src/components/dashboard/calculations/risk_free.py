@@ -0,0 +1,59 @@
+# daily risk free rates for calculation_api.py from the treasury yields in clean_data/treasury_data
+# (clean_data/treasury_cleaning.py, one csv per tenor with the yield in percent)
+# every tenor is loaded once and lined up with the price panel's trading days, a day without a quote
+# (bond market holiday) keeps the last known yield, days before the first quote use the constant rate
+# the daily rate is yield / 252 and its running compounding factor is kept as a prefix sum of
+# log(1 + rate), so the risk free return between any two panel days is two lookups
+# without treasury data the period rate is the constant rate * period_days / 252, exactly as before
+
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict
+from metrics_engine import TRADING_DAYS
+
+TENORS = ["3M", "5Y", "10Y", "30Y"]
+
+
+class RiskFreeCurve:
+    def __init__(self, data_dir: str, dates: pd.DatetimeIndex, fallback_rate: float):
+        self.fallback_rate = fallback_rate
+        self.daily_rates: Dict[str, np.ndarray] = {}
+        self.log_growth: Dict[str, np.ndarray] = {}  # prefix, log_growth[k] = sum of log(1 + rate) of days < k
+
+        # panel dates are midnight US time in UTC, i.e. early morning of the same calendar day
+        days = dates.tz_convert(None).normalize() if dates.tz is not None else dates.normalize()
+        for tenor in TENORS:
+            file_path = os.path.join(data_dir, f"{tenor}.csv")
+            if not os.path.exists(file_path):
+                continue
+            df = pd.read_csv(file_path, usecols=["Date", "Close"])
+            quotes = pd.Series(df["Close"].to_numpy(dtype=np.float64) / 100,
+                               index=pd.to_datetime(df["Date"].astype(str).str[:10])).dropna().sort_index()
+            if quotes.empty:
+                continue
+            annual = quotes[~quotes.index.duplicated(keep="last")].reindex(days, method="ffill").to_numpy()
+            annual = np.where(np.isnan(annual), fallback_rate, annual)
+
+            rates = annual / TRADING_DAYS
+            growth = np.zeros(len(rates) + 1)
+            np.cumsum(np.log1p(rates), out=growth[1:])
+            self.daily_rates[tenor] = rates
+            self.log_growth[tenor] = growth
+
+    def __contains__(self, tenor: str) -> bool:
+        return tenor in self.log_growth
+
+    def period_rate(self, tenor: str, first: np.ndarray, last: np.ndarray, period_days: np.ndarray) -> np.ndarray:
+        """
+        compounded risk free return per ticker over its panel rows first .. last (its first and last close
+        in the window, see MomentIndex.window_stats), one day of interest for every close like the
+        constant rate * period_days / 252
+        """
+        if tenor not in self.log_growth:
+            return self.fallback_rate * (np.maximum(period_days, 1) / TRADING_DAYS)
+        growth = self.log_growth[tenor]
+        has_close = period_days > 0
+        first = np.where(has_close, first, 0)
+        last = np.where(has_close, last, -1)
+        return np.where(has_close, np.expm1(growth[last + 1] - growth[first]), 0.0)
@@ -0,0 +1,185 @@
+# online sentiment scoring for calculation_api.py with the fine tuned regressor from src/data_processing
+# the model is loaded once, on the first request (torch is only imported then, the rest of the api
+# works without it) and always used from the same single worker thread, off the event loop
+# requests are not scored one by one: their texts go into an asyncio queue and a background task
+# takes up to max_batch_size of them at a time, waiting at most max_wait_ms for a batch to fill up,
+# so under concurrent load one model call serves many requests
+
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+DATA_PROCESSING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "data_processing"))
+
+
+class SentimentModel:
+    def __init__(self, checkpoint_path: str, backend: str = "fp32", score_cache_path: str = None,
+                 batch_size: int = 32):
+        self.checkpoint_path = checkpoint_path
+        self.backend = backend
+        self.score_cache_path = score_cache_path
+        self.batch_size = batch_size
+        self.model = None
+
+    def load(self):
+        if not os.path.isdir(self.checkpoint_path):
+            raise FileNotFoundError(f"no sentiment checkpoint at {self.checkpoint_path}")
+        if DATA_PROCESSING_DIR not in sys.path:
+            sys.path.append(DATA_PROCESSING_DIR)
+        import torch
+        from predict_tweets import load_scoring_model, score_texts, score_texts_cached
+        from score_cache import ScoreCache, checkpoint_id
+
+        if self.backend == "fp32":
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            self.model, self.tokenizer = load_scoring_model(self.checkpoint_path, self.device, compile=False)
+        else:
+            from cpu_inference import load_backend
+            self.device = torch.device("cpu")
+            self.model, self.tokenizer = load_backend(self.backend, self.checkpoint_path)
+
+        self.cache = None
+        if self.score_cache_path:
+            self.cache = ScoreCache(self.score_cache_path, checkpoint_id(self.checkpoint_path, self.backend))
+        self._score_texts, self._score_texts_cached = score_texts, score_texts_cached
+
+    def score(self, texts: List[str]) -> List[float]:
+        # only ever called from the batcher's worker thread
+        if self.model is None:
+            self.load()
+        if self.cache is not None:
+            scores, _ = self._score_texts_cached(self.model, self.tokenizer, texts, self.device, self.cache,
+                                                 self.batch_size)
+        else:
+            scores = self._score_texts(self.model, self.tokenizer, texts, self.device, self.batch_size)
+        return [float(score) for score in scores]
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.model is not None,
+            "backend": self.backend,
+            "score_cache": self.cache.stats() if self.model is not None and self.cache is not None else None,
+        }
+
+
+def _bucket(n: int) -> str:
+    # power of two buckets: "0", "1", "2-3", "4-7", ...
+    if n < 2:
+        return str(n)
+    low = 1 << (n.bit_length() - 1)
+    return f"{low}-{2 * low - 1}"
+
+
+class MicroBatcher:
+    def __init__(self, model: SentimentModel, max_batch_size: int = 32, max_wait_ms: float = 10):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._executor = ThreadPoolExecutor(max_workers=1)  # the model is used from this one thread
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        self.queue_depths = Counter()  # queue length seen by every arriving request
+        self.busy_seconds = 0.0
+
+    def _ensure_worker(self):
+        # queue and task belong to the running event loop, start them on first use (again if the loop changed)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def score(self, texts: List[str]) -> List[float]:
+        self._ensure_worker()
+        self.requests += 1
+        self.texts += len(texts)
+        self.queue_depths[_bucket(self._queue.qsize())] += 1
+
+        # texts carry their request's number, a failing batch is retried request by request
+        request_id = self.requests
+        futures = []
+        for text in texts:
+            future = self._loop.create_future()
+            self._queue.put_nowait((request_id, text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            batch = [item for item in batch if not item[2].done()]  # cancelled requests
+            if not batch:
+                continue
+
+            self.batches += 1
+            self.batch_sizes[len(batch)] += 1
+            start = time.perf_counter()
+            try:
+                await self._score_batch(batch)
+            except Exception as e:
+                requests = {}
+                for item in batch:
+                    requests.setdefault(item[0], []).append(item)
+                if len(requests) == 1:
+                    self._set_exception(batch, e)
+                else:
+                    # score every request on its own, so only the one that caused the failure gets it
+                    for request_batch in requests.values():
+                        try:
+                            await self._score_batch(request_batch)
+                        except Exception as request_error:
+                            self._set_exception(request_batch, request_error)
+            self.busy_seconds += time.perf_counter() - start
+
+    async def _score_batch(self, batch):
+        scores = await self._loop.run_in_executor(self._executor, self.model.score, [text for _, text, _ in batch])
+        for (_, _, future), score in zip(batch, scores):
+            if not future.done():
+                future.set_result(score)
+
+    @staticmethod
+    def _set_exception(batch, error: Exception):
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "requests": self.requests,
+            "texts": self.texts,
+            "batches": self.batches,
+            "mean_batch_size": sum(size * count for size, count in self.batch_sizes.items()) / self.batches if self.batches else 0.0,
+            "batch_size_histogram": {str(size): self.batch_sizes[size] for size in sorted(self.batch_sizes)},
+            "queue_depth_histogram": dict(sorted(self.queue_depths.items(), key=lambda item: int(item[0].split("-")[0]))),
+            "model_busy_seconds": self.busy_seconds,
+            "model": self.model.stats(),
+        }
@@ -0,0 +1,137 @@
+# process wide store of the cleaned tweets used by CommonWords (get_common_words.py)
+# every ticker's csv is read once, sorted by Created_at and kept as numpy arrays:
+#   created_at: int64 ns since epoch (UTC), scores: float64, file_rows: row of the tweet in the csv
+#   tokens: flat int32 array of word ids (already passed through WORD_MAPPING), offsets: start of each tweet in tokens
+# so tweet i has the words vocab[tokens[offsets[i]:offsets[i + 1]]]
+# a date range is then a searchsorted slice instead of a csv parse + boolean mask per request
+# the same arrays can be saved as a columnar copy of the csv (convert_to_columnar.py), load_corpus
+# reads that copy memory mapped when it is there and up to date, and the csv otherwise
+
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from typing import Dict, List, Tuple
+from word_mapping import WORD_MAPPING
+from word_count_index import WordCountIndex
+from columnar_store import read_columns, ticker_dir
+
+# the saved tokens are already mapped, so a columnar copy made with another WORD_MAPPING is out of date
+WORD_MAPPING_DIGEST = hashlib.sha1(json.dumps(WORD_MAPPING, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def binary_matrix(ids: np.ndarray, offsets: np.ndarray, n_columns: int) -> sparse.csr_matrix:
+    # csr tweets x words matrix with a 1 where the word is in the tweet
+    X = sparse.csr_matrix((np.ones(len(ids), dtype=np.int64), ids, offsets),
+                          shape=(len(offsets) - 1, n_columns))
+    X.sum_duplicates()
+    X.data[:] = 1
+    return X
+
+
+class TweetCorpus:
+    def __init__(self, ticker: str, created_at: np.ndarray, scores: np.ndarray,
+                 offsets: np.ndarray, tokens: np.ndarray, vocab: List[str], file_rows: np.ndarray):
+        self.ticker = ticker
+        self.created_at = created_at
+        self.scores = scores
+        self.file_rows = file_rows
+        self.offsets = offsets
+        self.tokens = tokens
+        self.vocab = vocab
+        self.word_ids = {word: i for i, word in enumerate(vocab)}
+
+        # CommonWords maps the loaded words through WORD_MAPPING a second time before counting,
+        # mapped_ids[token] is the id of that word in mapped_vocab
+        mapped_ids, mapped_vocab = pd.factorize(pd.Series([WORD_MAPPING.get(word, word) for word in vocab], dtype=object))
+        self.mapped_ids = mapped_ids.astype(np.int32)
+        self.mapped_vocab = list(mapped_vocab)
+
+        self.count_index = None  # WordCountIndex, see build_count_index
+
+    @classmethod
+    def from_csv(cls, ticker: str, file_path: str) -> "TweetCorpus":
+        df = pd.read_csv(file_path, usecols=["Tweet_Words", "Created_at", "Score"])
+        df.dropna(inplace=True)
+        df["Created_at"] = pd.to_datetime(df["Created_at"], utc=True)
+        df = df.sort_values("Created_at", kind="stable")  # stable keeps the file order for equal times
+
+        words = df["Tweet_Words"].str.split()
+        lengths = words.str.len().to_numpy(dtype=np.int64)
+        offsets = np.zeros(len(df) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        # intern the raw words, then map only the distinct ones through WORD_MAPPING
+        flat = [word for tweet in words for word in tweet]
+        raw_ids, raw_words = pd.factorize(pd.Series(flat, dtype=object))
+        mapped_ids, vocab = pd.factorize(pd.Series([WORD_MAPPING.get(word, word) for word in raw_words], dtype=object))
+        tokens = mapped_ids[raw_ids].astype(np.int32)
+
+        created_at = df["Created_at"].dt.tz_convert(None).to_numpy().astype("datetime64[ns]").astype(np.int64)
+        return cls(ticker, created_at, df["Score"].to_numpy(dtype=np.float64), offsets, tokens, list(vocab),
+                   df.index.to_numpy(dtype=np.int64))
+
+    @classmethod
+    def from_columns(cls, ticker: str, columns: dict) -> "TweetCorpus":
+        # inverse of columns(), the arrays can be memory mapped
+        return cls(ticker, columns["created_at"], np.asarray(columns["scores"], dtype=np.float64),
+                   columns["offsets"], columns["tokens"], columns["vocab"], columns["file_rows"])
+
+    def columns(self) -> dict:
+        # arrays to save for from_columns, scores go to float32 when that loses nothing
+        scores32 = self.scores.astype(np.float32)
+        lossless = np.array_equal(scores32.astype(np.float64), self.scores)
+        return {
+            "created_at": np.asarray(self.created_at, dtype=np.int64),
+            "scores": scores32 if lossless else np.asarray(self.scores, dtype=np.float64),
+            "offsets": np.asarray(self.offsets, dtype=np.int64),
+            "tokens": np.asarray(self.tokens, dtype=np.int32),
+            "vocab": self.vocab,
+            "file_rows": np.asarray(self.file_rows, dtype=np.int64),
+        }
+
+    def __len__(self) -> int:
+        return len(self.created_at)
+
+    def window(self, start_date: pd.Timestamp, end_date: pd.Timestamp) -> Tuple[int, int]:
+        # tweet range [lo, hi) with start_date <= Created_at <= end_date
+        lo = int(np.searchsorted(self.created_at, start_date.value, side="left"))
+        hi = int(np.searchsorted(self.created_at, end_date.value, side="right"))
+        return lo, max(lo, hi)
+
+    def word_matrix(self, lo: int, hi: int) -> sparse.csr_matrix:
+        # binary (tweets x mapped_vocab) matrix of the tweets in [lo, hi)
+        tokens = self.tokens[self.offsets[lo]:self.offsets[hi]]
+        return binary_matrix(self.mapped_ids[tokens], self.offsets[lo:hi + 1] - self.offsets[lo], len(self.mapped_vocab))
+
+    def build_count_index(self):
+        self.count_index = WordCountIndex(self)
+
+
+def load_corpus(data_dir: str, ticker: str) -> TweetCorpus:
+    file_path = os.path.join(data_dir, f"{ticker}.csv")
+    columns = read_columns(ticker_dir(data_dir, ticker), file_path, word_mapping=WORD_MAPPING_DIGEST)
+    if columns is not None:
+        return TweetCorpus.from_columns(ticker, columns)
+    return TweetCorpus.from_csv(ticker, file_path)
+
+
+class CorpusStore:
+    def __init__(self, data_dir: str, build_index: bool = False):
+        self.data_dir = data_dir
+        self.corpora: Dict[str, TweetCorpus] = {}
+        for file_name in sorted(os.listdir(data_dir)):
+            if file_name.endswith(".csv"):
+                ticker = os.path.splitext(file_name)[0]
+                corpus = load_corpus(data_dir, ticker)
+                if build_index:
+                    corpus.build_count_index()
+                self.corpora[ticker] = corpus
+
+    def get(self, ticker: str) -> TweetCorpus:
+        if ticker not in self.corpora:
+            file_path = os.path.join(self.data_dir, f"{ticker}.csv")
+            raise FileNotFoundError(f"GOD DAMN TICKER DOES NOT EXIST '{ticker}': {file_path}")
+        return self.corpora[ticker]
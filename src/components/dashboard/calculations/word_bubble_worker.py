@@ -0,0 +1,47 @@
+# worker side of the word bubble process pool used by calculation_api.py
+# CommonWords.calculate is cpu bound, running it inside the async endpoints blocks every other request,
+# so the api hands it to a ProcessPoolExecutor instead
+# every worker loads the tweet corpora (and their count indexes) once in init_worker,
+# a task then only sends the ticker, window and parameters and gets the word bubble data back
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from get_common_words import CommonWords
+from tweet_corpus import CorpusStore
+
+_corpus_store: Optional[CorpusStore] = None
+
+
+def init_worker(data_dir: str):
+    global _corpus_store
+    _corpus_store = CorpusStore(data_dir, build_index=True)
+
+
+def make_pool(data_dir: str, max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(data_dir,))
+
+
+def word_bubbles(ticker: str, start_date: str, end_date: str, min_count_percentage: float,
+                 top_n_words: int, filter_metric: str) -> Optional[dict]:
+    # None when there are no tweets to build the bubbles from, FileNotFoundError for an unknown ticker
+    analyzer = CommonWords(
+        ticker=ticker,
+        data_dir=_corpus_store.data_dir,
+        start_date=start_date,
+        end_date=end_date,
+        min_count_percentage=min_count_percentage,
+        top_n_words=top_n_words,
+        filter_metric=filter_metric,
+        corpus=_corpus_store.get(ticker),
+    )
+
+    result = analyzer.calculate()
+    if result is None:
+        return None
+
+    top_words, bottom_words, adj_matrix = result
+    return {
+        "top_words": top_words,
+        "bottom_words": bottom_words,
+        "adj_matrix": adj_matrix,
+    }
@@ -0,0 +1,77 @@
+# time bucketed word count index for one TweetCorpus (tweet_corpus.py)
+# the tweets are grouped into UTC days, and for every day we keep how many tweets contain each word
+# (document frequency), as a sparse (days x words) matrix
+# on top of the days there are sums over aligned runs of 2, 4, 8, ... days, so the whole days of any
+# [start_date, end_date] are covered by at most ~2 * log2(days) precomputed rows; only the tweets of the
+# partial days at the edges are counted directly, roughly the same work whatever the length of the window
+# (running totals per day would be fewer rows, but they are dense, every word seen so far has a value)
+# score sums are not kept here, adding block sums changes the float summation order, so CommonWords
+# adds up the scores of the words that pass min_count from the window's tweets instead
+
+import numpy as np
+from scipy import sparse
+
+NS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+
+
+def _pair_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    # row i of the result is rows 2i and 2i + 1 added up
+    n_rows = matrix.shape[0]
+    pairs = sparse.csr_matrix((np.ones(n_rows), (np.arange(n_rows) // 2, np.arange(n_rows))),
+                              shape=((n_rows + 1) // 2, n_rows))
+    return (pairs @ matrix).tocsr()
+
+
+class WordCountIndex:
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+        # bucket_bounds[k] is the first tweet of day k, tweets are sorted by time
+        days = corpus.created_at // NS_PER_DAY
+        self.bucket_bounds = np.flatnonzero(np.r_[True, days[1:] != days[:-1], True]) if len(days) else np.zeros(1, dtype=np.int64)
+        n_buckets = len(self.bucket_bounds) - 1
+
+        # (days x tweets) indicator times (tweets x words) gives the per day counts
+        X = corpus.word_matrix(0, len(corpus))
+        bucket_of = np.repeat(np.arange(n_buckets), np.diff(self.bucket_bounds))
+        S = sparse.csr_matrix((np.ones(len(corpus)), (bucket_of, np.arange(len(corpus)))),
+                              shape=(n_buckets, len(corpus)))
+
+        # level k row j covers days [j * 2^k, (j + 1) * 2^k)
+        self.level_counts = [(S @ X).tocsr()]
+        while self.level_counts[-1].shape[0] > 1:
+            self.level_counts.append(_pair_rows(self.level_counts[-1]))
+
+    def _bucket_rows(self, first_bucket: int, last_bucket: int):
+        # (level, row) pieces that exactly cover days [first_bucket, last_bucket)
+        pieces = []
+        start = first_bucket
+        while start < last_bucket:
+            level = 0
+            while level + 1 < len(self.level_counts) and start % (2 << level) == 0 and start + (2 << level) <= last_bucket:
+                level += 1
+            pieces.append((level, start >> level))
+            start += 1 << level
+        return pieces
+
+    def window_counts(self, lo: int, hi: int) -> np.ndarray:
+        """
+        document frequency of every word (ids of corpus.mapped_vocab) over tweets [lo, hi)
+        """
+        # whole days inside the window come from the index, the rest of the tweets are counted directly
+        first_bucket = int(np.searchsorted(self.bucket_bounds, lo, side="left"))
+        last_bucket = int(np.searchsorted(self.bucket_bounds, hi, side="right")) - 1
+        if last_bucket <= first_bucket:
+            return self._direct_counts(lo, hi)
+
+        pieces = self._bucket_rows(first_bucket, last_bucket)
+        counts = sparse.vstack([self.level_counts[level][row] for level, row in pieces]).sum(axis=0)
+        counts = np.asarray(counts).ravel()
+
+        for edge_lo, edge_hi in ((lo, self.bucket_bounds[first_bucket]), (self.bucket_bounds[last_bucket], hi)):
+            if edge_hi > edge_lo:
+                counts = counts + self._direct_counts(edge_lo, edge_hi)
+        return counts.astype(np.int64)
+
+    def _direct_counts(self, lo: int, hi: int) -> np.ndarray:
+        return np.asarray(self.corpus.word_matrix(lo, hi).sum(axis=0)).ravel().astype(np.int64)
@@ -1,70 +1,169 @@
-#code for sharpe ratio is taken from https://www.youtube.com/watch?v=r7JuZOzNiQE
-import pandas as pd
-import numpy as np
-import yfinance as yf  #need to be installed
-
-
-#return sharpe ratio, treynor ratio, alpha, and beta for chosen stock
-def metrics(chosen_stock, start_date, end_date, risk_free_rate_param):
-    #download data from yfinance(yahoo finance)
-    benchmark = '^GSPC'
-    stock_data = yf.download(chosen_stock, start=start_date,end=end_date,auto_adjust=False)
-    benchmark_data = yf.download(benchmark, start=start_date,end=end_date,auto_adjust=False)
-
-    #make into dataframe
-    stock_returns = stock_data['Adj Close'].pct_change().dropna()
-    benchmark_returns = benchmark_data['Adj Close'].pct_change().dropna()
-
-    #merge both stock_returns and benchmark_returns
-    returns = pd.merge(stock_returns,benchmark_returns,on="Date")
-
-    #calculate alpha and beta
-    x = returns.iloc[:,1]
-    y = returns.iloc[:,0]
-
-    X = np.vstack([x,np.ones(len(x))]).T
-    y
-    beta, alpha = np.linalg.lstsq(X,y,rcond=None)[0]
-
-    #risk free rate / US treasurey yield
-    #can choose between 13 weeks T-Bill / 5 year treasurey / 10 years treasure / 30 years treasure
-    #13 weeks ^IRX
-    #5 years ^FVX
-    #10 years ^TNX
-    #30 year ^TYX
-
-    #treasury yield data
-    if risk_free_rate_param == 5:
-        treasury = "^FVX"
-    elif risk_free_rate_param == 10:
-        treasury = "^TNX"
-    elif risk_free_rate_param == 30:
-        treasury = "^TYX"
-    else:
-        treasury = "^IRX"
-
-    treasury_data = yf.download(treasury, start=start_date,end=end_date)
-    #treasury_data
-    treasury_returns = treasury_data['Close'].pct_change().dropna()
-    treasury_returns
-    sum = 0
-    for i in range(treasury_returns.shape[0]-1):
-        sum = sum + (treasury_returns.iloc[i+1,0] - treasury_returns.iloc[i,0])
-    risk_free_rate = sum/(treasury_returns.shape[0]-1)
-
-
-    #sharpe ratio
-    sum = 0
-    diff_list = []
-    for i in range(len(y)-1):
-        diff_list.append(returns.iloc[i+1,0] - returns.iloc[i,0])
-        sum = sum + (returns.iloc[i+1,0] - returns.iloc[i,0])
-    avg = sum/(len(y)-1)
-    diff_np = np.array(diff_list)
-    std = np.std(diff_np)
-    sharpe_ratio = (avg - risk_free_rate) / std
-
-    #treynor ratio 
-    treynor_ratio = (avg - risk_free_rate) / beta
-
-    return sharpe_ratio, treynor_ratio, alpha, beta
\ No newline at end of file
+#code for sharpe ratio is taken from https://www.youtube.com/watch?v=r7JuZOzNiQE
+import os
+from abc import ABC, abstractmethod
+import pandas as pd
+import numpy as np
+
+# the prices come from a data provider, by default the local csvs in clean_data (no network calls),
+# YahooProvider downloads them like before (needs yfinance, pip install yfinance)
+# a provider loads the whole history of a symbol once and keeps it, later calls only slice it
+# run from the repo root, the local paths are relative to it
+STOCK_DATA_PATH = "clean_data/stock_data"
+TREASURY_DATA_PATH = "clean_data/treasury_data"  # clean_data/treasury_cleaning.py, yields from FRED
+BENCHMARK = '^GSPC'
+
+#risk free rate / US treasurey yield
+#can choose between 13 weeks T-Bill / 5 year treasurey / 10 years treasure / 30 years treasure
+#13 weeks ^IRX
+#5 years ^FVX
+#10 years ^TNX
+#30 year ^TYX
+TREASURY_SYMBOLS = {5: "^FVX", 10: "^TNX", 30: "^TYX"}
+DEFAULT_TREASURY = "^IRX"
+
+
+class DataProvider(ABC):
+    # daily (adjusted) closes by symbol, subclasses implement load
+    def __init__(self):
+        self._cache = {}
+
+    @abstractmethod
+    def load(self, symbol):
+        # whole history of symbol as a Series indexed by (tz naive) date, KeyError if there is none
+        ...
+
+    def history(self, symbol):
+        if symbol not in self._cache:
+            self._cache[symbol] = self.load(symbol)
+        return self._cache[symbol]
+
+    def closes(self, symbols, start_date, end_date):
+        # (dates x symbols) closes with start_date <= date < end_date (like yf.download), NaN where a symbol has no row
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        series = {}
+        for symbol in symbols:
+            history = self.history(symbol)
+            series[symbol] = history[(history.index >= start) & (history.index < end)]
+        return pd.DataFrame(series, columns=list(symbols))
+
+
+class LocalCSVProvider(DataProvider):
+    # csvs with Date and Close columns, one file per symbol, the first dir that has the symbol wins
+    # the benchmark index has no csv, SPY tracks it, the treasury yields are saved by tenor
+    def __init__(self, data_dirs=(STOCK_DATA_PATH, TREASURY_DATA_PATH), aliases=None):
+        super().__init__()
+        self.data_dirs = list(data_dirs)
+        self.aliases = {'^GSPC': 'SPY', '^IRX': '3M', '^FVX': '5Y', '^TNX': '10Y', '^TYX': '30Y'} if aliases is None else aliases
+
+    def load(self, symbol):
+        name = self.aliases.get(symbol, symbol)
+        for data_dir in self.data_dirs:
+            file_path = os.path.join(data_dir, f"{name}.csv")
+            if os.path.exists(file_path):
+                df = pd.read_csv(file_path, usecols=["Date", "Close"])
+                # the calendar day of the row, "2016-10-03 00:00:00-04:00" -> 2016-10-03
+                dates = pd.to_datetime(df["Date"].astype(str).str[:10])
+                return pd.Series(df["Close"].to_numpy(dtype=np.float64), index=dates, name=symbol).sort_index()
+        raise KeyError(f"no local data for {symbol} in {self.data_dirs}")
+
+
+class YahooProvider(DataProvider):
+    # yahoo finance, the original source of this file, needs the network
+    def __init__(self):
+        super().__init__()
+        import yfinance  # optional dependency
+        self.yf = yfinance
+
+    def load(self, symbol):
+        data = self.yf.download(symbol, period="max", auto_adjust=True, progress=False)
+        close = data['Close']
+        if isinstance(close, pd.DataFrame):
+            close = close.iloc[:, 0]
+        if close.empty:
+            raise KeyError(f"no yahoo finance data for {symbol}")
+        return close.dropna().rename(symbol)
+
+
+default_provider = None
+
+
+def get_default_provider():
+    global default_provider
+    if default_provider is None:
+        default_provider = LocalCSVProvider()
+    return default_provider
+
+
+def daily_returns(closes):
+    # pct change of every column over its own trading days (like .pct_change().dropna() per symbol)
+    return pd.DataFrame({symbol: closes[symbol].dropna().pct_change().dropna() for symbol in closes.columns},
+                        columns=closes.columns)
+
+
+def risk_free_rate(treasury, start_date, end_date, provider):
+    # average day to day change of the treasury yield's daily change
+    # None when the provider has no data for the treasury symbol
+    try:
+        yields = provider.closes([treasury], start_date, end_date)
+    except KeyError:
+        return None
+    treasury_returns = daily_returns(yields)[treasury].dropna().to_numpy()
+    return np.diff(treasury_returns).mean()
+
+
+def _ratios(x, y, rf):
+    # x: (days,) benchmark returns, y: (days x stocks) stock returns on the same days
+    X = np.vstack([x, np.ones(len(x))]).T
+    beta, alpha = np.linalg.lstsq(X, y, rcond=None)[0]
+
+    #sharpe ratio on the day to day changes of the returns
+    diffs = np.diff(y, axis=0)
+    avg = diffs.mean(axis=0)
+    std = diffs.std(axis=0)
+    sharpe_ratio = (avg - rf) / std
+
+    #treynor ratio
+    treynor_ratio = (avg - rf) / beta
+    return sharpe_ratio, treynor_ratio, alpha, beta
+
+
+def metrics_many(stocks, start_date, end_date, risk_free_rate_param, provider=None):
+    """
+    sharpe ratio, treynor ratio, alpha and beta of every stock against BENCHMARK, one row per stock
+    stocks that traded on every benchmark day share one lstsq call (y has a column per stock),
+    the others get their own on the days they have
+    """
+    provider = provider or get_default_provider()
+    stocks = list(stocks)
+    returns = daily_returns(provider.closes(stocks + [BENCHMARK], start_date, end_date))
+    benchmark_returns = returns.pop(BENCHMARK)
+
+    treasury = TREASURY_SYMBOLS.get(risk_free_rate_param, DEFAULT_TREASURY)
+    rf = risk_free_rate(treasury, start_date, end_date, provider)
+    if rf is None:
+        print(f"no {treasury} data, using a risk free rate of 0")
+        rf = 0.0
+
+    #merge stock returns and benchmark returns on Date
+    returns = returns[benchmark_returns.notna()]
+    x = benchmark_returns.dropna().to_numpy()
+    stock_returns = returns.reindex(columns=stocks)
+
+    results = pd.DataFrame(np.nan, index=stocks, columns=["sharpe_ratio", "treynor_ratio", "alpha", "beta"])
+    complete = [stock for stock in stocks if stock_returns[stock].notna().all()]
+    if complete and len(x):
+        results.loc[complete] = np.column_stack(_ratios(x, stock_returns[complete].to_numpy(), rf))
+    for stock in stocks:
+        if stock in complete:
+            continue
+        valid = stock_returns[stock].notna().to_numpy()
+        if valid.sum() > 2:
+            results.loc[stock] = [value[0] for value in _ratios(x[valid], stock_returns[stock].to_numpy()[valid, None], rf)]
+    return results
+
+
+#return sharpe ratio, treynor ratio, alpha, and beta for chosen stock
+def metrics(chosen_stock, start_date, end_date, risk_free_rate_param, provider=None):
+    sharpe_ratio, treynor_ratio, alpha, beta = metrics_many([chosen_stock], start_date, end_date,
+                                                            risk_free_rate_param, provider).loc[chosen_stock]
+    return sharpe_ratio, treynor_ratio, alpha, beta
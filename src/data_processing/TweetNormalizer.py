@@ -1,5 +1,8 @@
 # checked
 # not out code - copied from the BERTweet repository
+# (normalize_one / normalize_many at the bottom are ours, a faster version of normalizeTweet)
+import re
+from functools import lru_cache
 from emoji import demojize
 from nltk.tokenize import TweetTokenizer
 
@@ -53,6 +56,65 @@ def normalizeTweet(tweet):
     return " ".join(normTweet.split())
 
 
+# normalizeTweet is the reference, normalize_one gives exactly the same string (normalizer_parity.py checks)
+# - tokens repeat a lot across tweets ($SPY, "the", emojis), so normalizeToken is memoized, which also
+#   makes it a lookup table for demojize, the slowest part of normalizeToken
+# - text of only ascii letters and spaces (the already cleaned tweets in clean_data) tokenizes to its
+#   words, none of the TweetTokenizer patterns that could join or split them (urls, emoticons, phone
+#   numbers, html entities, ...) can match without a digit or punctuation, so str.split is enough
+# - most tweets contain none of the strings the replace chains look for, a chain only runs when one of
+#   its trigger substrings is in the tweet. the chains themselves stay as they are, a replace can create
+#   a match for a later one ("n't " -> " n't ") so they can not be merged into one regex substitution
+# - normalize_many only normalizes each distinct tweet once (retweets, bot spam)
+_normalize_token = lru_cache(maxsize=1 << 18)(normalizeToken)
+_PLAIN_WORDS_RE = re.compile(r"[A-Za-z ]*")
+
+
+def normalize_one(tweet):
+    if "’" in tweet:
+        tweet = tweet.replace("’", "'")
+    if "…" in tweet:
+        tweet = tweet.replace("…", "...")
+    tokens = tweet.split() if _PLAIN_WORDS_RE.fullmatch(tweet) else tokenizer.tokenize(tweet)
+    normTweet = " ".join([_normalize_token(token) for token in tokens])
+
+    if "'" in normTweet:
+        # every pattern of the first two chains has an apostrophe, except "cannot "
+        normTweet = (
+            normTweet.replace("cannot ", "can not ")
+            .replace("n't ", " n't ")
+            .replace("n 't ", " n't ")
+            .replace("ca n't", "can't")
+            .replace("ai n't", "ain't")
+        )
+        normTweet = (
+            normTweet.replace("'m ", " 'm ")
+            .replace("'re ", " 're ")
+            .replace("'s ", " 's ")
+            .replace("'ll ", " 'll ")
+            .replace("'d ", " 'd ")
+            .replace("'ve ", " 've ")
+        )
+    elif "cannot " in normTweet:
+        normTweet = normTweet.replace("cannot ", "can not ")
+    if ". m " in normTweet:
+        # all four patterns contain ". m "
+        normTweet = (
+            normTweet.replace(" p . m .", "  p.m.")
+            .replace(" p . m ", " p.m ")
+            .replace(" a . m .", " a.m.")
+            .replace(" a . m ", " a.m ")
+        )
+
+    return " ".join(normTweet.split())
+
+
+def normalize_many(tweets):
+    normalized = {}
+    return [normalized[tweet] if tweet in normalized else normalized.setdefault(tweet, normalize_one(tweet))
+            for tweet in tweets]
+
+
 if __name__ == "__main__":
     print(
         normalizeTweet(
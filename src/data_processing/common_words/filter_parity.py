@@ -0,0 +1,93 @@
+# checks that FilterStopwords.filter_many gives exactly the same tokens as the original unmemoized
+# pipeline (reference_filter below, the filter_stopwords from before the memos) and times both
+#
+#   python filter_parity.py                          the tweets in clean_data/twit_data
+#   python filter_parity.py --csv a.csv --limit 5000
+import glob
+import time
+import argparse
+import nltk
+import pandas as pd
+from filter_stopwords import FilterStopwords
+
+TRICKY_TWEETS = [
+    "",
+    "I can't believe $AAPL didn't move, we cannot hold. Next week!",
+    "gonna wanna gimme lemme gotta cannot",
+    "It’s a ‘great’ day… isn’t it",
+    "earnings at 4 p.m. and the call at 8 a.m. tomorrow",
+    "@elonmusk what about $TSLA?? https://t.co/abc123 www.tesla.com",
+    "🚀🚀🚀 to the moon 🌕 $GME 💎🙌",
+    "&amp; &lt;3 running runners ran easily fairly",
+    "Mr. Smith went to Washington. He bought shares in Apple Inc. today",
+    "U.S. stocks rallied; Dow +2.5% (record) -- \"amazing\" 'rally'",
+]
+
+
+def reference_filter(stopword_filter, text):
+    # the original pipeline: both tokenizers on every tweet, no memos
+    if not isinstance(text, str):
+        cleaned = ""
+    else:
+        text = text.replace("’", "'").replace("…", "...")
+        tokens = stopword_filter.tokenizer.tokenize(text)
+        normalized = " ".join([stopword_filter._normalize_token(t) for t in tokens
+                               if stopword_filter._normalize_token(t)])
+        for old, new in [("cannot ", "can not "), ("n't ", " n't "), ("n 't ", " n't "), ("ca n't", "can't"),
+                         ("ai n't", "ain't"), ("'m ", " 'm "), ("'re ", " 're "), ("'s ", " 's "),
+                         ("'ll ", " 'll "), ("'d ", " 'd "), ("'ve ", " 've "), (" p . m .", " p.m."),
+                         (" a . m .", " a.m.")]:
+            normalized = normalized.replace(old, new)
+        cleaned = " ".join(normalized.split())
+
+    tokens = [word.translate(stopword_filter.punctuation_table)
+              for word in nltk.word_tokenize(cleaned) if word.isalpha() and len(word) > 1]
+    filtered_tokens = []
+    for token in tokens:
+        token_lower = token.lower()
+        if stopword_filter.use_stemming:
+            if stopword_filter.stemmer.stem(token_lower) not in stopword_filter.stemmed_words_to_filter:
+                filtered_tokens.append(token)
+        elif token_lower not in stopword_filter.words_to_filter:
+            filtered_tokens.append(token)
+    return filtered_tokens
+
+
+def read_tweets(paths, column):
+    tweets = []
+    for path in paths:
+        tweets.extend(pd.read_csv(path, usecols=[column])[column].fillna("").astype(str).tolist())
+    return tweets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="parity and speed of FilterStopwords.filter_many")
+    parser.add_argument("--csv", nargs="+", default=sorted(glob.glob("../../../clean_data/twit_data/*.csv")))
+    parser.add_argument("--column", default="Tweet")
+    parser.add_argument("--limit", type=int, default=None, help="only the first n tweets")
+    parser.add_argument("--no-stemming", action="store_true")
+    args = parser.parse_args()
+
+    tweets = TRICKY_TWEETS + read_tweets(args.csv, args.column)
+    if args.limit:
+        tweets = tweets[:args.limit]
+    print(f"{len(tweets)} tweets, {len(set(tweets))} distinct")
+
+    stopword_filter = FilterStopwords(use_stemming=not args.no_stemming)
+    start = time.perf_counter()
+    expected = [reference_filter(stopword_filter, tweet) for tweet in tweets]
+    reference = time.perf_counter() - start
+
+    stopword_filter = FilterStopwords(use_stemming=not args.no_stemming)  # cold memos
+    start = time.perf_counter()
+    filtered = stopword_filter.filter_many(tweets)
+    fast = time.perf_counter() - start
+
+    mismatches = [(tweet, want, got) for tweet, want, got in zip(tweets, expected, filtered) if want != got]
+    for tweet, want, got in mismatches[:20]:
+        print(f"MISMATCH {tweet!r}\n  reference:   {want}\n  filter_many: {got}")
+    print(f"parity: {len(tweets) - len(mismatches)}/{len(tweets)} identical")
+    print(f"reference:   {len(tweets) / reference:,.0f} tweets/sec")
+    print(f"filter_many: {len(tweets) / fast:,.0f} tweets/sec ({reference / fast:.1f}x)")
+    if mismatches:
+        raise SystemExit(1)
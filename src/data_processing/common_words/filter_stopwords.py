@@ -2,11 +2,20 @@ import pandas as pd
 import nltk
 import string
 import re
+from functools import lru_cache
 from nltk.corpus import stopwords
 from nltk.tokenize import TweetTokenizer
 from emoji import demojize
 from nltk.stem import PorterStemmer
 
+# bound of each memo below, the vocabulary is tiny next to the number of tokens
+MEMO_SIZE = 1 << 17
+
+# text of only ascii letters and spaces: TweetTokenizer gives the same tokens as str.split, and
+# word_tokenize splits it word by word (no sentence ends, the treebank rules only split inside a word
+# like cannot -> can not), so those tokenizations can be memoized per word
+_PLAIN_WORDS_RE = re.compile(r"[A-Za-z ]*")
+
 class FilterStopwords:
     def __init__(self, use_stemming=True):
         # way faster than spacy
@@ -96,6 +105,11 @@ class FilterStopwords:
             self.stemmer = PorterStemmer()
             self.stemmed_words_to_filter = {self.stemmer.stem(w) for w in self.words_to_filter}
 
+        # memoized per distinct token / word, every call after the first is a dict lookup
+        self._normalized_token = lru_cache(maxsize=MEMO_SIZE)(self._normalize_token)
+        self._word_tokens = lru_cache(maxsize=MEMO_SIZE)(self._tokenize_word)
+        self._kept_token = lru_cache(maxsize=MEMO_SIZE)(self._filter_token)
+
     def _normalize_token(self, token):
         token = token.lower()
         if token.startswith("@"):
@@ -115,8 +129,8 @@ class FilterStopwords:
         if not isinstance(text, str):
             return ""
         text = text.replace("’", "'").replace("…", "...")
-        tokens = self.tokenizer.tokenize(text)
-        normalized = " ".join([self._normalize_token(t) for t in tokens if self._normalize_token(t)])
+        tokens = text.split() if _PLAIN_WORDS_RE.fullmatch(text) else self.tokenizer.tokenize(text)
+        normalized = " ".join([t for t in map(self._normalized_token, tokens) if t])
 
         # filter contractions
         normalized = normalized.replace("cannot ", "can not ")
@@ -134,23 +148,40 @@ class FilterStopwords:
         normalized = normalized.replace(" a . m .", " a.m.")
         return " ".join(normalized.split())
 
+    def _tokenize_word(self, word):
+        return tuple(nltk.word_tokenize(word))
+
+    def _filter_token(self, word):
+        # the token to keep, None when it is filtered out
+        # lots of single letters if not done
+        if not (word.isalpha() and len(word) > 1):
+            return None
+        token = word.translate(self.punctuation_table)
+        token_lower = token.lower()
+        if self.use_stemming:
+            if self.stemmer.stem(token_lower) in self.stemmed_words_to_filter:
+                return None
+        elif token_lower in self.words_to_filter:
+            return None
+        return token
+
     def filter_stopwords(self, text):
         cleaned = self._normalize_tweet(text)
-        tokens = nltk.word_tokenize(cleaned)
-        # lots of single letters if not done
-        tokens = [word.translate(self.punctuation_table)
-                  for word in tokens if word.isalpha() and len(word) > 1]
-        filtered_tokens = []
-        for token in tokens:
-            token_lower = token.lower()
-            if self.use_stemming:
-                token_stem = self.stemmer.stem(token_lower)
-                if token_stem not in self.stemmed_words_to_filter:
-                    filtered_tokens.append(token)
-            else:
-                if token_lower not in self.words_to_filter:
-                    filtered_tokens.append(token)
-        return filtered_tokens
+        if _PLAIN_WORDS_RE.fullmatch(cleaned):
+            tokens = [token for word in cleaned.split() for token in self._word_tokens(word)]
+        else:
+            tokens = nltk.word_tokenize(cleaned)
+        return [token for token in map(self._kept_token, tokens) if token is not None]
+
+    def filter_many(self, texts):
+        # filter_stopwords for a list of tweets, every distinct tweet is only filtered once
+        filtered = {}
+        results = []
+        for text in texts:
+            if text not in filtered:
+                filtered[text] = self.filter_stopwords(text)
+            results.append(list(filtered[text]))
+        return results
 
 
 # all_words_2 = [
@@ -1,19 +1,106 @@
+import os
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 from .filter_stopwords import FilterStopwords  # MAKE SURE TO CHANGE IF NOT IN IPYNB
 
-def clean_tweets(df):
+# run from src/data_processing to clean a csv that does not fit in memory:
+#   python -m common_words.tweet_cleaner tweets.csv cleaned_tweets.csv --workers 8
+
+
+def _clean(stopword_filter, df):
+    tweets = df['Tweet'].fillna("").astype(str).tolist()
+    return [' '.join(tokens) for tokens in stopword_filter.filter_many(tweets)]
+
+
+def clean_tweets(df, workers=1, chunk_size=20000):
     """
     function to clean tweets
+    workers > 1 cleans chunks of chunk_size rows in that many processes
     """
+    if 'Tweet' not in df.columns:
+        print("No Tweet in DF")
+        return
+
+    if workers == 1:
+        result_df = df.copy()
+        result_df['cleaned_tweet'] = _clean(FilterStopwords(), result_df)
+        return result_df
+
+    chunks = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+    cleaned = list(clean_tweet_chunks(chunks, workers))
+    if not cleaned:
+        return df.assign(cleaned_tweet=pd.Series(dtype=object))
+    return pd.concat(cleaned)
+
+
+# one FilterStopwords per worker process, built once by the pool initializer
+# (nltk resources, stemmer and its memos, which then carry over from chunk to chunk)
+_worker_filter = {}
+
+
+def _init_clean_worker(use_stemming):
+    _worker_filter["filter"] = FilterStopwords(use_stemming)
+
+
+def _clean_in_worker(df):
+    return _clean(_worker_filter["filter"], df)
+
+
+def _with_cleaned(df, cleaned):
     result_df = df.copy()
+    result_df['cleaned_tweet'] = cleaned
+    return result_df
 
-    if 'Tweet' not in result_df.columns:
-        print("No Tweet in DF")
+
+def clean_tweet_chunks(chunks, workers=None, use_stemming=True):
+    """
+    clean_tweets for an iterator of DataFrames, e.g. pd.read_csv(..., chunksize=...)
+    yields the cleaned chunks in input order, at most 2 chunks per worker are read ahead
+    so files larger than memory can be cleaned chunk by chunk
+    workers=None uses every core
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        stopword_filter = FilterStopwords(use_stemming)
+        for df in chunks:
+            yield _with_cleaned(df, _clean(stopword_filter, df))
         return
 
-    stopword_filter = FilterStopwords()
-    tweets = result_df['Tweet'].fillna("").astype(str)
+    with ProcessPoolExecutor(workers, initializer=_init_clean_worker, initargs=(use_stemming,)) as pool:
+        running = deque()
+        for df in chunks:
+            # only the tweets go to the workers, the chunk waits here for its result
+            running.append((df, pool.submit(_clean_in_worker, df[['Tweet']])))
+            if len(running) >= 2 * workers:
+                df, future = running.popleft()
+                yield _with_cleaned(df, future.result())
+        while running:
+            df, future = running.popleft()
+            yield _with_cleaned(df, future.result())
+
+
+def clean_csv(input_path, output_path, workers=None, chunk_size=20000):
+    # streams input_path through clean_tweet_chunks, the output is written next to it and renamed when done
+    tmp_path = output_path + ".tmp"
+    rows = 0
+    with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+        chunks = pd.read_csv(input_path, chunksize=chunk_size)
+        for i, df in enumerate(clean_tweet_chunks(chunks, workers)):
+            df.to_csv(out, header=i == 0, index=False)
+            rows += len(df)
+            print(f"cleaned {rows} tweets")
+    os.replace(tmp_path, output_path)
+    return rows
+
 
-    result_df['cleaned_tweet'] = tweets.apply(lambda tweet: ' '.join(stopword_filter.filter_stopwords(tweet)))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="add a cleaned_tweet column to a csv with a Tweet column")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--workers", type=int, default=None, help="default: every core")
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    args = parser.parse_args()
 
-    return result_df
\ No newline at end of file
+    clean_csv(args.input, args.output, args.workers, args.chunk_size)
@@ -0,0 +1,161 @@
+# cpu inference for BERTweetSentimentRegressor (tweet_bert_finetune.py), the scoring machines have no gpu
+# backends:
+#   fp32  the model as trained
+#   int8  torch dynamic quantization, the nn.Linear weights are stored as int8 and the activations are
+#         quantized on the fly, nearly all of bertweet's compute is in those layers
+#   onnx  the fp32 model exported to onnx and run by onnxruntime (optional, pip install onnx onnxruntime)
+# every backend is called like the model, model(input_ids=..., attention_mask=...) -> (batch,) scores,
+# so predict_tweets.score_texts works with all of them
+#
+#   python cpu_inference.py evaluate --test-csv test_df.csv    MAE of every backend vs the labels and vs fp32
+#   python cpu_inference.py benchmark --test-csv test_df.csv   tweets/sec of every backend
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from transformers import AutoTokenizer
+from predict_tweets import checkpoint_path, load_scoring_model, score_texts
+
+BACKENDS = ["fp32", "int8", "onnx"]
+
+
+def quantize_int8(model):
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(model, tokenizer, onnx_path, opset=17):
+    # batch size and sequence length stay dynamic, so the dynamic padding batches work as they are
+    example = tokenizer(["export example tweet"], return_tensors="pt")
+    os.makedirs(os.path.dirname(os.path.abspath(onnx_path)), exist_ok=True)
+    torch.onnx.export(
+        model,
+        (example["input_ids"], example["attention_mask"]),
+        onnx_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["score"],
+        dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                      "attention_mask": {0: "batch", 1: "sequence"},
+                      "score": {0: "batch"}},
+        opset_version=opset,
+        dynamo=False,
+    )
+
+
+class OnnxRegressor:
+    # onnxruntime session with the same call signature as the torch model
+    def __init__(self, onnx_path, threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, input_ids, attention_mask):
+        score, = self.session.run(None, {
+            "input_ids": input_ids.cpu().numpy().astype(np.int64),
+            "attention_mask": attention_mask.cpu().numpy().astype(np.int64),
+        })
+        return torch.from_numpy(score)
+
+
+def ensure_onnx_export(checkpoint_path, onnx_path=None, model=None, tokenizer=None):
+    # the onnx file is exported next to the checkpoint the first time it is needed
+    onnx_path = onnx_path or os.path.join(checkpoint_path, "model.onnx")
+    if not os.path.exists(onnx_path):
+        if model is None:
+            model, tokenizer = load_scoring_model(checkpoint_path, torch.device("cpu"), compile=False)
+        print(f"exporting onnx model to {onnx_path}")
+        export_onnx(model, tokenizer, onnx_path + ".tmp")
+        os.replace(onnx_path + ".tmp", onnx_path)
+    return onnx_path
+
+
+def load_backend(backend, checkpoint_path, onnx_path=None, threads=None):
+    """
+    (model, tokenizer) for one of BACKENDS on the cpu
+    threads only applies to onnx, torch uses torch.set_num_threads
+    onnx only loads the torch model when model.onnx still has to be exported
+    """
+    if backend == "onnx":
+        onnx_path = ensure_onnx_export(checkpoint_path, onnx_path)
+        return OnnxRegressor(onnx_path, threads), AutoTokenizer.from_pretrained(checkpoint_path)
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend '{backend}', expected one of {BACKENDS}")
+
+    model, tokenizer = load_scoring_model(checkpoint_path, torch.device("cpu"), compile=False)
+    if backend == "int8":
+        return quantize_int8(model), tokenizer
+    return model, tokenizer
+
+
+def load_test_set(test_csv, limit=None):
+    # held out set in the training format (text, score), same cleaning as sentiment_trainer.py
+    test_df = pd.read_csv(test_csv)
+    test_df["score"] = pd.to_numeric(test_df["score"], errors="coerce")
+    test_df.dropna(subset=["text", "score"], inplace=True)
+    if limit:
+        test_df = test_df.head(limit)
+    return test_df["text"].astype(str).tolist(), test_df["score"].to_numpy(dtype=np.float64)
+
+
+def evaluate(backends, checkpoint_path, test_csv, limit=None, batch_size=32, onnx_path=None):
+    texts, labels = load_test_set(test_csv, limit)
+    device = torch.device("cpu")
+    print(f"evaluating on {len(texts)} tweets")
+
+    predictions = {}
+    for backend in ["fp32"] + [backend for backend in backends if backend != "fp32"]:
+        model, tokenizer = load_backend(backend, checkpoint_path, onnx_path)
+        predictions[backend] = score_texts(model, tokenizer, texts, device, batch_size)
+
+    reference = predictions["fp32"]
+    for backend, predicted in predictions.items():
+        deviation = np.abs(predicted - reference)
+        print(f"{backend:>5}: MAE vs labels {np.abs(predicted - labels).mean():.4f}, "
+              f"vs fp32 mean {deviation.mean():.5f} max {deviation.max():.5f}")
+    return predictions
+
+
+def benchmark(backends, checkpoint_path, test_csv, limit=2000, batch_size=32, repeats=3, onnx_path=None):
+    texts, _ = load_test_set(test_csv, limit)
+    device = torch.device("cpu")
+    print(f"benchmarking on {len(texts)} tweets, batch size {batch_size}, {torch.get_num_threads()} threads")
+
+    results = {}
+    for backend in backends:
+        model, tokenizer = load_backend(backend, checkpoint_path, onnx_path)
+        score_texts(model, tokenizer, texts[:batch_size], device, batch_size)  # warm up
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            score_texts(model, tokenizer, texts, device, batch_size)
+            best = min(best, time.perf_counter() - start)
+        results[backend] = len(texts) / best
+        print(f"{backend:>5}: {results[backend]:.1f} tweets/sec")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cpu backends for the tweet sentiment regressor")
+    parser.add_argument("command", choices=["evaluate", "benchmark", "export"])
+    parser.add_argument("--checkpoint", default=checkpoint_path)
+    parser.add_argument("--test-csv", help="held out csv with text and score columns")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--limit", type=int, default=None, help="only the first n tweets of the test set")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--onnx-path", default=None, help="default: model.onnx in the checkpoint dir")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        model, tokenizer = load_scoring_model(args.checkpoint, torch.device("cpu"), compile=False)
+        export_onnx(model, tokenizer, args.onnx_path or os.path.join(args.checkpoint, "model.onnx"))
+    elif args.command == "evaluate":
+        evaluate(args.backends, args.checkpoint, args.test_csv, args.limit, args.batch_size, args.onnx_path)
+    else:
+        benchmark(args.backends, args.checkpoint, args.test_csv, args.limit or 2000, args.batch_size,
+                  onnx_path=args.onnx_path)
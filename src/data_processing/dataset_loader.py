@@ -1,37 +1,117 @@
 
+import numpy as np
 from torch.utils.data import Dataset
 import torch
-from TweetNormalizer import normalizeTweet
+from TweetNormalizer import normalize_one
+from token_cache import load_or_tokenize
 
 # NEED TO CONFIRM MAX LENGTH OF BETWEET MODEL
 class TweetDataset(Dataset):
-    def __init__(self, tweets, scores=None, tokenizer=None, max_len=128): 
-        self.scores = scores  
+    def __init__(self, tweets, scores=None, tokenizer=None, max_len=128, padding="max_length",
+                 pretokenize=False, cache_dir=None, normalize=True):
+        self.tweets = tweets
+        self.scores = scores
         self.tokenizer = tokenizer
         self.max_len = max_len
+        # "max_length" pads every tweet to max_len (training), False leaves the padding to
+        # DynamicPaddingCollator so a batch is only as long as its longest tweet (inference)
+        self.padding = padding
+        # with pretokenize the whole corpus is tokenized once here instead of in every __getitem__,
+        # cache_dir keeps those tokens on disk for the next epoch / run (token_cache.py)
+        self.cache_dir = cache_dir
+        self.normalize = normalize  # False when the tweets already went through normalizeTweet
+        self._input_ids = None
+        self._offsets = None
+        if pretokenize:
+            self.pretokenize()
 
     def __len__(self):
         return len(self.tweets)
 
+    def pretokenize(self):
+        if self._offsets is None:
+            self._input_ids, self._offsets = load_or_tokenize(self.tweets, self.tokenizer, self.max_len, self.cache_dir,
+                                                             normalize=self.normalize)
+
+    def token_lengths(self):
+        # number of tokens per tweet, used to put tweets of about the same length in the same batch
+        self.pretokenize()
+        return np.diff(self._offsets)
+
+    def _pretokenized_item(self, idx):
+        ids = torch.from_numpy(np.array(self._input_ids[self._offsets[idx]:self._offsets[idx + 1]], dtype=np.int64))
+        if self.padding is False:
+            return {"input_ids": ids, "attention_mask": torch.ones_like(ids)}
+
+        # same as padding="max_length" in the tokenizer call
+        n_pad = self.max_len - len(ids)
+        pad = torch.full((n_pad,), self.tokenizer.pad_token_id, dtype=torch.long)
+        mask = torch.ones(len(ids), dtype=torch.long)
+        no_mask = torch.zeros(n_pad, dtype=torch.long)
+        if self.tokenizer.padding_side == "left":
+            return {"input_ids": torch.cat([pad, ids]), "attention_mask": torch.cat([no_mask, mask])}
+        return {"input_ids": torch.cat([ids, pad]), "attention_mask": torch.cat([mask, no_mask])}
+
     def __getitem__(self, idx):
-        tweet = str(self.tweets[idx])
-        normalized_tweet = normalizeTweet(tweet)
-
-        encoding = self.tokenizer(
-            normalized_tweet,
-            max_length=self.max_len,
-            padding="max_length",
-            truncation=True,
-            return_tensors="pt"
-        )
-
-        item = {
-            "input_ids": encoding["input_ids"].squeeze(0),
-            "attention_mask": encoding["attention_mask"].squeeze(0),
-        }
+        if self._offsets is not None:
+            item = self._pretokenized_item(idx)
+        else:
+            tweet = str(self.tweets[idx])
+            normalized_tweet = normalize_one(tweet) if self.normalize else tweet
+
+            encoding = self.tokenizer(
+                normalized_tweet,
+                max_length=self.max_len,
+                padding=self.padding,
+                truncation=True,
+                return_tensors="pt"
+            )
+
+            item = {
+                "input_ids": encoding["input_ids"].squeeze(0),
+                "attention_mask": encoding["attention_mask"].squeeze(0),
+            }
 
         # Add labels if they exist (for training)
         if self.scores is not None:
             item["labels"] = torch.tensor(float(self.scores[idx]), dtype=torch.float)
 
         return item
+
+
+def length_bucketed_batches(lengths, batch_size, window=None):
+    """
+    index batches for DataLoader(batch_sampler=...) with tweets of similar length together
+    the rows are sorted by length inside consecutive windows of `window` rows (all rows if None),
+    so every row of a window is done before the next window starts
+    """
+    window = window or len(lengths)
+    batches = []
+    for start in range(0, len(lengths), window):
+        order = start + np.argsort(lengths[start:start + window], kind="stable")
+        batches.extend(order[i:i + batch_size].tolist() for i in range(0, len(order), batch_size))
+    return batches
+
+
+class DynamicPaddingCollator:
+    # pads the batch to its longest tweet instead of max_len, on the tokenizer's padding_side
+    def __init__(self, pad_token_id, padding_side="right"):
+        if padding_side not in ("left", "right"):
+            raise ValueError(f"padding_side must be 'left' or 'right', got '{padding_side}'")
+        self.pad_token_id = pad_token_id
+        self.padding_side = padding_side
+
+    def __call__(self, items):
+        longest = max(len(item["input_ids"]) for item in items)
+        input_ids = torch.full((len(items), longest), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(items), longest), dtype=torch.long)
+        for i, item in enumerate(items):
+            n = len(item["input_ids"])
+            columns = slice(longest - n, longest) if self.padding_side == "left" else slice(0, n)
+            input_ids[i, columns] = item["input_ids"]
+            attention_mask[i, columns] = item["attention_mask"]
+
+        batch = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "labels" in items[0]:
+            batch["labels"] = torch.stack([item["labels"] for item in items])
+        return batch
@@ -0,0 +1,84 @@
+# checks that normalize_many (TweetNormalizer.py) gives exactly the same strings as normalizeTweet
+# and times both, on the tweets of some csv files plus a list of tricky cases
+# (contractions, a.m./p.m., handles, urls, emojis, html entities, curly apostrophes, ...)
+#
+#   python normalizer_parity.py                                  the tweets in clean_data/twit_data
+#   python normalizer_parity.py --csv test_df.csv --column text  any csv with a tweet column
+import glob
+import time
+import argparse
+import pandas as pd
+from TweetNormalizer import _normalize_token, normalize_many, normalizeTweet
+
+TRICKY_TWEETS = [
+    "",
+    "   ",
+    "I can't believe $AAPL didn't move, we cannot hold",
+    "ai n't no way, I'm sure they're right, it's fine, we'll see, I'd say, they've sold",
+    "It’s a ‘great’ day… isn’t it",
+    "earnings at 4 p.m. and the call at 8 a.m. tomorrow, p . m . a . m",
+    "meeting 9 a.m., closes 4 p.m",
+    "cannot stop cannot",
+    "@elonmusk @SEC_News what about $TSLA?? https://t.co/abc123 www.tesla.com",
+    "HTTP://EXAMPLE.COM Www.Example.com",
+    "🚀🚀🚀 to the moon 🌕 $GME 💎🙌",
+    "👨‍👩‍👧 family emoji, flags 🇺🇸🇨🇳 and skin tones 👍🏽",
+    "&amp; &lt;3 &gt;:( &#128512; &nbsp;",
+    "soooooooo goooood!!!!!!!!! ....... ???",
+    "RT @user: $SPY puts :) :-( <3 ;-) xD",
+    "don't won't shouldn't ca n't",
+    "the stock's price, its a bull's market",
+    "tab\tseparated\nnew line\r\nwindows",
+    "numbers 1,000.50 +5% -3.2% (555) 123-4567 #hashtag",
+    "…",
+    "’",
+    "he said ’’hello’’",
+    "n't 't 's 'm",
+    "a . m . p . m .",
+]
+
+
+def read_tweets(paths, column):
+    tweets = []
+    for path in paths:
+        df = pd.read_csv(path, usecols=[column])
+        tweets.extend(df[column].fillna("").astype(str).tolist())
+    return tweets
+
+
+def time_it(function, tweets, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        _normalize_token.cache_clear()  # every run starts cold
+        start = time.perf_counter()
+        function(tweets)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="parity and speed of normalize_many vs normalizeTweet")
+    parser.add_argument("--csv", nargs="+", default=sorted(glob.glob("../../clean_data/twit_data/*.csv")))
+    parser.add_argument("--column", default="Tweet")
+    parser.add_argument("--limit", type=int, default=None, help="only the first n tweets")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    tweets = TRICKY_TWEETS + read_tweets(args.csv, args.column)
+    if args.limit:
+        tweets = tweets[:args.limit]
+    print(f"{len(tweets)} tweets, {len(set(tweets))} distinct")
+
+    expected = [normalizeTweet(tweet) for tweet in tweets]
+    mismatches = [(tweet, want, got) for tweet, want, got in zip(tweets, expected, normalize_many(tweets))
+                  if want != got]
+    for tweet, want, got in mismatches[:20]:
+        print(f"MISMATCH {tweet!r}\n  normalizeTweet: {want!r}\n  normalize_many: {got!r}")
+    print(f"parity: {len(tweets) - len(mismatches)}/{len(tweets)} identical")
+
+    reference = time_it(lambda batch: [normalizeTweet(tweet) for tweet in batch], tweets, args.repeats)
+    fast = time_it(normalize_many, tweets, args.repeats)
+    print(f"normalizeTweet: {len(tweets) / reference:,.0f} tweets/sec")
+    print(f"normalize_many: {len(tweets) / fast:,.0f} tweets/sec ({reference / fast:.1f}x)")
+    if mismatches:
+        raise SystemExit(1)
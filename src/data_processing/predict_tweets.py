@@ -1,129 +1,323 @@
+# scores the unlabelled tweets with the fine tuned regressor
+# the input csv is streamed in chunks of chunk_size rows, every scored chunk goes to its own csv
+# in output_dir (chunk_00000.csv, ...) and is recorded in output_dir/manifest.json
+# when a run is interrupted, running it again skips the chunks in the manifest and goes on from there,
+# memory only ever holds one chunk whatever the size of the input
+# --merge writes all chunk files (in order) into one csv at the end
+# without a gpu, --backend int8 / onnx runs one of the cpu backends of cpu_inference.py
+# and --workers N scores N chunks at a time, each in its own process with its own copy of the model
+# scores are kept in a sqlite cache (score_cache.py, --score-cache), a tweet whose normalized text
+# was scored before by the same model is not run through the model again
 import os
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
 import torch
 import pandas as pd
 from transformers import AutoTokenizer
 from safetensors.torch import load_model
-from dataset_loader import TweetDataset
+from dataset_loader import DynamicPaddingCollator, TweetDataset, length_bucketed_batches
+from score_cache import ScoreCache, checkpoint_id
 from tweet_bert_finetune import BERTweetSentimentRegressor
+from TweetNormalizer import normalize_many
 
 
 # CHANGE THIS TO YOURS IF YOU WANT TO RUN
 checkpoint_path = "bertweet_regressor/checkpoint-7953"
 data_path = "/home/ginger/code/gderiddershanghai/DVA_Team_173/data_full/processed/large_dataset_UNLABELLED.csv"
+output_dir = "/home/ginger/code/gderiddershanghai/DVA_Team_173/data_full/processed/large_dataset_SCORES_chunks"
 output_path = "/home/ginger/code/gderiddershanghai/DVA_Team_173/data_full/processed/large_dataset_SCORES.csv"
+score_cache_path = "score_cache.sqlite"
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print(f"Using device: {device}")
+MANIFEST_FILE = "manifest.json"
 
-df = pd.read_csv(data_path, delimiter=",", encoding="utf-8", on_bad_lines="skip")
-df["full_text"] = df["Tweet"]
-print(f"Loaded {len(df)} rows from dataset.")
 
-print(df.head())
-print(df.tail())
+def load_scoring_model(checkpoint_path, device, compile=True):
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint_path)
 
+    model = BERTweetSentimentRegressor()
+    model.to(device)
+    load_model(model, os.path.join(checkpoint_path, "model.safetensors"))
 
-if "full_text" not in df.columns:
-    print('WRONG COLUMN NAME')
+    # model.half() / don't do it, just run on cuda and its super fast
 
-if "predicted_score" in df.columns:
-    df = df[df["predicted_score"].isna()].reset_index(drop=True)
-print(f"Filtered dataset, remaining rows to predict: {len(df)}")
+    if compile and hasattr(torch, "compile"):
+        model = torch.compile(model)
 
-print("_________________________________________________")
+    model.eval()
+    return model, tokenizer
 
-tokenizer = AutoTokenizer.from_pretrained(checkpoint_path)
 
-model = BERTweetSentimentRegressor()
-model.to(device)
-load_model(model, os.path.join(checkpoint_path, "model.safetensors"))
+def score_texts(model, tokenizer, texts, device, batch_size=32, max_len=128, normalize=True):
+    # most tweets are 20-40 tokens, padding all of them to 128 was mostly wasted compute
+    # tweets are tokenized once up front, sorted by length and every batch is padded only
+    # to its longest tweet, the predictions go back to their rows after
+    dataset = TweetDataset(tweets=texts, scores=None, tokenizer=tokenizer, max_len=max_len,
+                           padding=False, pretokenize=True, normalize=normalize)
+    batches = length_bucketed_batches(dataset.token_lengths(), batch_size)
+    dataloader = torch.utils.data.DataLoader(
+        dataset, batch_sampler=batches, collate_fn=DynamicPaddingCollator(tokenizer.pad_token_id, tokenizer.padding_side),
+        pin_memory=device.type == "cuda")
 
-# model.half() / don't do it, just run on cuda and its super fast
+    predictions = np.full(len(texts), np.nan)
+    with torch.no_grad():
+        for batch_rows, batch in zip(batches, dataloader):
+            input_ids = batch["input_ids"].to(device).long()
+            attention_mask = batch["attention_mask"].to(device)  # the model casts the mask to its own dtype
 
-if hasattr(torch, "compile"):
-    model = torch.compile(model)
+            outputs = model(input_ids=input_ids, attention_mask=attention_mask).view(-1)
+            predictions[batch_rows] = outputs.float().cpu().numpy()
+    return predictions
 
-model.eval()
 
-tweet_texts = df["full_text"].tolist()
-dataset = TweetDataset(
-    tweets=tweet_texts,
-    scores=None,
-    tokenizer=tokenizer,
-    max_len=128)
+def score_texts_cached(model, tokenizer, texts, device, cache, batch_size=32, max_len=128):
+    """
+    score_texts through a ScoreCache: every distinct normalized tweet goes through the model
+    at most once and not at all when the cache already has its score
+    returns the scores and how many tweets the model actually ran on
+    """
+    normalized = normalize_many([str(tweet) for tweet in texts])
+    keys = [cache.key(tweet) for tweet in normalized]
+    text_of = dict(zip(keys, normalized))  # one text per distinct key
 
-print("loaded dataset for preds")
-def predict_tweets_and_save(model, dataset, df, output_path, save_interval=10000):
-    batch_size = 32
-    dataloader = torch.utils.data.DataLoader(
-        dataset, batch_size=batch_size, shuffle=False, pin_memory=True, num_workers=4)
-    
-    result_df = df.copy()
-    
-    
-    
-    # copied from tweet_bert_finetune.py
-    if os.path.exists(output_path):
-        backup_path = output_path + ".bak"
-        os.rename(output_path, backup_path)
-        print(f"Backed up existing file to {backup_path}")
-    
-    # VERY IMPORTANT OR IT WILL SKIP
-    processed_idx = 0
-    last_saved_idx = 0
-    
-    with torch.no_grad():
-        for i, batch in enumerate(dataloader):
-            input_ids = batch["input_ids"].to(device).long()  
-            attention_mask = batch["attention_mask"].to(device).half()  
-
-            outputs = model(input_ids=input_ids, attention_mask=attention_mask).squeeze()
-            
-            # Handle both batch and single-item outputs
-            if outputs.dim() == 0:  
-                batch_predictions = [outputs.cpu().item()]
-            else:
-                batch_predictions = outputs.cpu().tolist()
-            
-            # Add predictions to the DataFrame at correct indices
-            batch_start_idx = processed_idx
-            batch_end_idx = batch_start_idx + len(batch_predictions)
-            
-            for j, pred in enumerate(batch_predictions):
-                idx = batch_start_idx + j
-                if idx < len(result_df):
-                    result_df.at[idx, "predicted_score"] = pred
-            
-            processed_idx = batch_end_idx
-            
-            if i % 100 == 0:
-                print(f"---------------------------------processed {processed_idx} tweets")
-            
-            # SAVE
-            if processed_idx - last_saved_idx >= save_interval:
-                save_slice = result_df.iloc[last_saved_idx:processed_idx]
-                
-                # only write heaedr first pass
-                mode = "w" if last_saved_idx == 0 else "a"
-                header = last_saved_idx == 0
-                
-                save_slice.to_csv(output_path, mode=mode, header=header, index=False)
-                print(f"did rows {last_saved_idx} thru {processed_idx}")
-                
-                last_saved_idx = processed_idx
-    
-    # save ramaing rows
-    if processed_idx > last_saved_idx:
-        save_slice = result_df.iloc[last_saved_idx:processed_idx]
-        mode = "w" if last_saved_idx == 0 else "a"
-        header = last_saved_idx == 0
-        
-        save_slice.to_csv(output_path, mode=mode, header=header, index=False)
-        print("had some more rows")
-    
-    print(f"preds saved to saved to {output_path}")
-    return result_df
-
-df_with_predictions = predict_tweets_and_save(model, dataset, df, output_path)
-print(df_with_predictions.tail())
-print('og shaope:', df.shape, 'new shape:', df_with_predictions.shape)
+    known = cache.get_many(list(text_of))
+    missing = [key for key in text_of if key not in known]
+    if missing:
+        scores = score_texts(model, tokenizer, [text_of[key] for key in missing], device, batch_size, max_len,
+                             normalize=False)
+        new_scores = dict(zip(missing, scores.tolist()))
+        cache.put_many(new_scores)
+        known.update(new_scores)
+
+    return np.array([known[key] for key in keys], dtype=np.float64), len(missing)
+
+
+def _input_stamp(data_path, chunk_size, checkpoint_path, backend):
+    # a manifest only resumes the exact same input, chunking and model
+    stat = os.stat(data_path)
+    return {
+        "input": os.path.abspath(data_path),
+        "input_size": stat.st_size,
+        "input_mtime_ns": stat.st_mtime_ns,
+        "chunk_size": chunk_size,
+        "checkpoint": os.path.abspath(checkpoint_path),
+        "backend": backend,
+    }
+
+
+def load_manifest(output_dir, stamp):
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {**stamp, "completed": {}}
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if any(manifest.get(key) != value for key, value in stamp.items()):
+        raise ValueError(f"{output_dir} holds chunks of another input/chunk size/checkpoint/backend, use a new output dir")
+    return manifest
+
+
+def _write_atomic(path, write):
+    # write to a temp file and rename, a killed run never leaves a half written chunk or manifest
+    write(path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def save_manifest(output_dir, manifest):
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=1)
+    _write_atomic(os.path.join(output_dir, MANIFEST_FILE), write)
+
+
+def chunk_file(output_dir, chunk_id):
+    return os.path.join(output_dir, f"chunk_{chunk_id:05d}.csv")
+
+
+def pending_chunks(data_path, chunk_size, completed):
+    # (chunk id, rows to score) for every chunk of the input that is not in the manifest yet
+    reader = pd.read_csv(data_path, delimiter=",", encoding="utf-8", on_bad_lines="skip", chunksize=chunk_size)
+    for chunk_id, df in enumerate(reader):
+        if str(chunk_id) in completed:
+            continue
+
+        df["full_text"] = df["Tweet"]
+        if "predicted_score" in df.columns:
+            df = df[df["predicted_score"].isna()].copy()
+        yield chunk_id, df
+
+
+def score_chunk(model, tokenizer, device, output_dir, chunk_id, df, batch_size, cache=None):
+    # returns (chunk id, rows, rows the model ran on)
+    texts = df["full_text"].tolist()
+    if cache is not None:
+        df["predicted_score"], model_rows = score_texts_cached(model, tokenizer, texts, device, cache, batch_size)
+    else:
+        df["predicted_score"] = score_texts(model, tokenizer, texts, device, batch_size) if len(df) else []
+        model_rows = len(df)
+    _write_atomic(chunk_file(output_dir, chunk_id), lambda tmp_path: df.to_csv(tmp_path, index=False))
+    return chunk_id, len(df), model_rows
+
+
+def _log_chunk(chunk_id, rows, model_rows, completed, start):
+    saved = 1 - model_rows / rows if rows else 0.0
+    print(f"chunk {chunk_id}: {rows} tweets ({model_rows} through the model, {saved:.0%} from cache/duplicates), "
+          f"{sum(completed.values())} done, {time.time() - start:.0f}s")
+
+
+def _open_manifest(output_dir, data_path, chunk_size, checkpoint_path, backend):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir, _input_stamp(data_path, chunk_size, checkpoint_path, backend))
+    completed = manifest["completed"]  # chunk id (str, json keys) -> rows written
+    if completed:
+        print(f"resuming, {len(completed)} chunks ({sum(completed.values())} rows) already done")
+    return manifest
+
+
+def score_csv(model, tokenizer, device, data_path, output_dir, checkpoint_path, chunk_size=10000, batch_size=32,
+              backend="fp32", cache=None):
+    manifest = _open_manifest(output_dir, data_path, chunk_size, checkpoint_path, backend)
+    completed = manifest["completed"]
+
+    start = time.time()
+    for chunk_id, df in pending_chunks(data_path, chunk_size, completed):
+        _, rows, model_rows = score_chunk(model, tokenizer, device, output_dir, chunk_id, df, batch_size, cache)
+        completed[str(chunk_id)] = rows
+        save_manifest(output_dir, manifest)
+        _log_chunk(chunk_id, rows, model_rows, completed, start)
+
+    if cache is not None:
+        print(f"score cache: {cache.stats()}")
+    return manifest
+
+
+# one model replica per worker process, loaded once by the pool initializer
+_worker_model = {}
+
+
+def _init_scoring_worker(checkpoint_path, backend, threads, cache_path=None, model_id=None):
+    # every worker gets its share of the cores, more threads than cores in total only slows all of them down
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    if backend == "fp32":
+        model, tokenizer = load_scoring_model(checkpoint_path, torch.device("cpu"), compile=False)
+    else:
+        from cpu_inference import load_backend
+        model, tokenizer = load_backend(backend, checkpoint_path, threads=threads)
+    cache = ScoreCache(cache_path, model_id) if cache_path else None
+    _worker_model.update(model=model, tokenizer=tokenizer, cache=cache)
+
+
+def _score_chunk_in_worker(output_dir, chunk_id, df, batch_size):
+    return score_chunk(_worker_model["model"], _worker_model["tokenizer"], torch.device("cpu"),
+                       output_dir, chunk_id, df, batch_size, _worker_model["cache"])
+
+
+def score_csv_sharded(checkpoint_path, data_path, output_dir, workers, threads_per_worker=None,
+                      chunk_size=10000, batch_size=32, backend="fp32", cache_path=None):
+    """
+    cpu scoring with `workers` processes, the chunks are handed out in input order as workers free up
+    and only the main process writes the manifest, merge_chunks puts the chunks back in input order
+    at most 2 chunks per worker are read ahead, so memory stays bounded
+    """
+    manifest = _open_manifest(output_dir, data_path, chunk_size, checkpoint_path, backend)
+    completed = manifest["completed"]
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    print(f"scoring with {workers} workers x {threads} threads")
+
+    if backend == "onnx":
+        from cpu_inference import ensure_onnx_export
+        ensure_onnx_export(checkpoint_path)  # once here, not in every worker at the same time
+
+    # the workers share the cache file, each with its own connection
+    model_id = checkpoint_id(checkpoint_path, backend) if cache_path else None
+    start = time.time()
+    totals = {"rows": 0, "model_rows": 0}
+
+    def record(finished):
+        for future in finished:
+            chunk_id, rows, model_rows = future.result()
+            completed[str(chunk_id)] = rows
+            totals["rows"] += rows
+            totals["model_rows"] += model_rows
+            _log_chunk(chunk_id, rows, model_rows, completed, start)
+        save_manifest(output_dir, manifest)
+
+    # spawn, a forked child would inherit the parent's torch thread pools
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_scoring_worker,
+                             initargs=(checkpoint_path, backend, threads, cache_path, model_id)) as pool:
+        running = set()
+        for chunk_id, df in pending_chunks(data_path, chunk_size, completed):
+            running.add(pool.submit(_score_chunk_in_worker, output_dir, chunk_id, df, batch_size))
+            if len(running) >= 2 * workers:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                record(finished)
+        record(running)
+
+    if cache_path and totals["rows"]:
+        print(f"model ran on {totals['model_rows']} of {totals['rows']} tweets, "
+              f"{1 - totals['model_rows'] / totals['rows']:.0%} from the score cache or duplicates")
+    return manifest
+
+
+def merge_chunks(output_dir, output_path):
+    # concatenate the chunk csvs in chunk order, keeping only the first header
+    with open(os.path.join(output_dir, MANIFEST_FILE)) as f:
+        completed = json.load(f)["completed"]
+    chunk_ids = sorted(int(chunk_id) for chunk_id in completed)
+
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8", newline="") as out:
+            for i, chunk_id in enumerate(chunk_ids):
+                with open(chunk_file(output_dir, chunk_id), encoding="utf-8", newline="") as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(header)
+                    for block in iter(lambda: f.read(1 << 20), ""):
+                        out.write(block)
+    _write_atomic(output_path, write)
+    print(f"merged {len(chunk_ids)} chunks ({sum(completed.values())} rows) into {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="score the unlabelled tweets in resumable chunks")
+    parser.add_argument("--checkpoint", default=checkpoint_path)
+    parser.add_argument("--input", default=data_path)
+    parser.add_argument("--output-dir", default=output_dir)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--backend", choices=["fp32", "int8", "onnx"], default="fp32",
+                        help="int8 / onnx are cpu only, see cpu_inference.py")
+    parser.add_argument("--workers", type=int, default=1, help="score on the cpu with this many processes")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="default: cores / workers")
+    parser.add_argument("--score-cache", default=score_cache_path, help="sqlite file of known scores")
+    parser.add_argument("--no-score-cache", action="store_true")
+    parser.add_argument("--merge", nargs="?", const=output_path, default=None,
+                        help="also write all chunks into one csv (default %(const)s)")
+    args = parser.parse_args()
+
+    cache_path = None if args.no_score_cache else args.score_cache
+
+    if args.workers > 1:
+        print(f"Using device: cpu, backend: {args.backend}")
+        score_csv_sharded(args.checkpoint, args.input, args.output_dir, args.workers, args.threads_per_worker,
+                          args.chunk_size, args.batch_size, args.backend, cache_path)
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() and args.backend == "fp32" else "cpu")
+        print(f"Using device: {device}, backend: {args.backend}")
+
+        if args.backend == "fp32":
+            # torch.compile only pays off on the gpu, on the cpu the compile time is most of a short run
+            model, tokenizer = load_scoring_model(args.checkpoint, device, compile=device.type == "cuda")
+        else:
+            from cpu_inference import load_backend
+            model, tokenizer = load_backend(args.backend, args.checkpoint)
+        cache = ScoreCache(cache_path, checkpoint_id(args.checkpoint, args.backend)) if cache_path else None
+        score_csv(model, tokenizer, device, args.input, args.output_dir, args.checkpoint, args.chunk_size,
+                  args.batch_size, args.backend, cache)
+
+    if args.merge:
+        merge_chunks(args.output_dir, args.merge)
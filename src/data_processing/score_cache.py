@@ -0,0 +1,64 @@
+# persistent cache of model scores, retweets and bot spam mean the same tweet gets scored over and over
+# the key is a hash of the normalized tweet (normalizeTweet) and of the model that scored it,
+# so one cache file can hold the scores of several checkpoints / backends side by side
+# stored in a local sqlite file (WAL mode), so several scoring processes can share it
+
+import hashlib
+import os
+import sqlite3
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS scores (key BLOB PRIMARY KEY, score REAL NOT NULL) WITHOUT ROWID"
+LOOKUP_BATCH = 500  # keys per SELECT ... IN (...), below sqlite's variable limit
+
+
+def checkpoint_id(checkpoint_path, backend="fp32"):
+    # content hash of the weights, a retrained checkpoint in the same dir gets new keys
+    digest = hashlib.sha1()
+    with open(os.path.join(checkpoint_path, "model.safetensors"), "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"{backend}:{digest.hexdigest()[:16]}"
+
+
+class ScoreCache:
+    def __init__(self, path, model_id):
+        self.path = path
+        self.model_id = model_id
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, normalized_tweet):
+        return hashlib.blake2b(f"{self.model_id}\0{normalized_tweet}".encode("utf-8", "surrogatepass"),
+                               digest_size=16).digest()
+
+    def get_many(self, keys):
+        # key -> score for the keys that are in the cache
+        found = {}
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            batch = keys[start:start + LOOKUP_BATCH]
+            rows = self.conn.execute(
+                f"SELECT key, score FROM scores WHERE key IN ({','.join('?' * len(batch))})", batch)
+            found.update(rows)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, scores):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)", scores.items())
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
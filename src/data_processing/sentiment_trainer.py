@@ -31,6 +31,7 @@ def main():
     train_fp = "/home/ginger/code/gderiddershanghai/DVA_Team_173/data_full/training_data/train_df.csv"
     test_fp = "/home/ginger/code/gderiddershanghai/DVA_Team_173/data_full/training_data/test_df.csv"
     model_weights_fp = "/home/ginger/code/gderiddershanghai/DVA_Team_173/weights"
+    token_cache_dir = "token_cache" # tokenized tweets, reused by later runs (token_cache.py)
     os.makedirs(model_weights_fp, exist_ok=True)
 
     ############################### loading and preprocessing data
@@ -53,14 +54,18 @@ def main():
         tweets=train_df["text"].tolist(),
         scores=train_df["score"].tolist(),
         tokenizer=tokenizer,
-        max_len=128) # short tweets, 128 is enough
+        max_len=128, # short tweets, 128 is enough
+        pretokenize=True, # tokenize once instead of every epoch
+        cache_dir=token_cache_dir)
     
     # ended up not using this because it kept breaking my code and couldnt figure out why
     test_dataset = TweetDataset(
         tweets=test_df["text"].tolist(),
         scores=test_df["score"].tolist(),
         tokenizer=tokenizer,
-        max_len=128
+        max_len=128,
+        pretokenize=True,
+        cache_dir=token_cache_dir
     )
 
 
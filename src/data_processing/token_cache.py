@@ -0,0 +1,85 @@
+# tokenizes a whole list of tweets once and keeps the result on disk for TweetDataset (dataset_loader.py)
+# the token ids of all tweets are one flat int32 array, tweet i is input_ids[offsets[i]:offsets[i + 1]]
+# (no padding, truncated to max_len), both arrays are saved as .npy and read back memory mapped
+# the cache dir name is a hash of everything that changes the ids: the tweets themselves,
+# the tokenizer (name, class, vocab), max_len and the source of TweetNormalizer.py,
+# so a new checkpoint, a different max_len or an edit to the normalizer gets its own cache
+
+import hashlib
+import json
+import os
+import numpy as np
+import TweetNormalizer
+from TweetNormalizer import normalize_many
+
+CACHE_VERSION = 1
+
+
+def _normalizer_digest():
+    with open(TweetNormalizer.__file__, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _tokenizer_digest(tokenizer):
+    vocab = json.dumps(sorted(tokenizer.get_vocab().items()), ensure_ascii=False)
+    return hashlib.sha1(f"{type(tokenizer).__name__}|{tokenizer.name_or_path}|{vocab}".encode("utf-8")).hexdigest()
+
+
+def _tweets_digest(tweets):
+    digest = hashlib.sha1()
+    for tweet in tweets:
+        digest.update(str(tweet).encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cache_key(tweets, tokenizer, max_len, normalize=True):
+    parts = [str(CACHE_VERSION), _tweets_digest(tweets), _tokenizer_digest(tokenizer), str(max_len),
+             _normalizer_digest() if normalize else "not normalized"]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:20]
+
+
+def tokenize_all(tweets, tokenizer, max_len, batch_size=1024, normalize=True):
+    # normalize and tokenize in batches with a single tokenizer call per batch
+    # normalize=False for tweets that already went through normalizeTweet
+    lengths = np.zeros(len(tweets), dtype=np.int64)
+    chunks = []
+    for start in range(0, len(tweets), batch_size):
+        batch = tweets[start:start + batch_size]
+        normalized = [str(tweet) for tweet in batch]
+        if normalize:
+            normalized = normalize_many(normalized)
+        encoding = tokenizer(normalized, max_length=max_len, truncation=True, padding=False)
+        lengths[start:start + len(normalized)] = [len(ids) for ids in encoding["input_ids"]]
+        chunks.extend(np.asarray(ids, dtype=np.int32) for ids in encoding["input_ids"])
+
+    offsets = np.zeros(len(tweets) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    input_ids = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+    return input_ids, offsets
+
+
+def load_or_tokenize(tweets, tokenizer, max_len, cache_dir=None, batch_size=1024, normalize=True):
+    """
+    (input_ids, offsets) for the tweets, from cache_dir when they were tokenized the same way before
+    without a cache_dir everything is tokenized in memory
+    """
+    if cache_dir is None:
+        return tokenize_all(tweets, tokenizer, max_len, batch_size, normalize)
+
+    path = os.path.join(cache_dir, cache_key(tweets, tokenizer, max_len, normalize))
+    ids_path = os.path.join(path, "input_ids.npy")
+    offsets_path = os.path.join(path, "offsets.npy")
+    if os.path.exists(offsets_path):
+        print(f"using cached tokens from {path}")
+        return np.load(ids_path, mmap_mode="r"), np.load(offsets_path, mmap_mode="r")
+
+    input_ids, offsets = tokenize_all(tweets, tokenizer, max_len, batch_size, normalize)
+    os.makedirs(path, exist_ok=True)
+    # offsets go last, they mark the cache as complete
+    for file_path, values in ((ids_path, input_ids), (offsets_path, offsets)):
+        with open(file_path + ".tmp", "wb") as f:
+            np.save(f, values, allow_pickle=False)
+        os.replace(file_path + ".tmp", file_path)
+    print(f"saved tokens of {len(tweets)} tweets to {path}")
+    return input_ids, offsets